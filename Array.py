@@ -6,35 +6,53 @@ from ezdxf.addons import Importer
 from ezdxf.addons.drawing.matplotlib import MatplotlibBackend
 from ezdxf.addons.drawing import Frontend, RenderContext
 import numpy as np
+import hashlib
+import pickle
 from pathlib import Path
 from os.path import exists
 from matplotlib import pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 import os
+from . import functions as fc
+from .StreamWriter import StreamWriter
+from .Manifest import Manifest, content_hash
+from .Profiler import Profiler
+from .DocumentTemplate import new_drawing
+from .Preview import save_preview
 
 class Array():
-    def __init__(self, input_dxf_path, n_pixels, x_pos, y_pos, rotation=None, mirror=None, output_dxf='array.dxf', feedline_dxf=None, wafer_dxf=None):
+    def __init__(self, input_dxf_path, n_pixels, x_pos, y_pos, rotation=None, mirror=None, output_dxf='array.dxf', feedline_dxf=None, wafer_dxf=None, instancing=False, workers=1, stream=False, manifest=None, profiler=None, nodes=None):
         '''
         This class is used for the generation of an array design.
 
         Parameters
         ----------
-        input_dxf_path : string
-            Path to the dxf pixel files.
+        input_dxf_path : string or list of pixels
+            Path to the dxf pixel files ('pixel_1.dxf', 'pixel_2.dxf', ...)
+            or ordered list of pixel objects (HilbertLShape, HilbertIShape,
+            DualPolCross, ...) to be placed directly from memory, without
+            writing and reading back their dxf files. The pixel objects are
+            not modified.
         n_pixels : int
             Number of pixel of the array.
-        x_pos : list of floats
-            Ordered list of x positions of each pixel in microns.
-        y_pos : list of floats
-            Ordered list of y positions of each pixel in microns.
-        rotation : list of floats, optional
-            Ordered list of rotation angle of each pixel in degrees. The
-            default is None.
-        mirror : list of chars, optional
+        x_pos : list or numpy.ndarray of floats
+            Ordered list of x positions of each pixel in microns. Not used
+            (can be None) if nodes is given.
+        y_pos : list or numpy.ndarray of floats
+            Ordered list of y positions of each pixel in microns. Not used
+            (can be None) if nodes is given.
+        rotation : list or numpy.ndarray of floats, optional
+            Ordered list of rotation angle of each pixel in degrees. Not used
+            if nodes is given. The default is None.
+        mirror : list or numpy.ndarray of chars, optional
             ordered list of chars ('x', 'y' or None) of mirroring parameters, 
             ex. 'x' means mirror with respect to the x axis.  The default is 
             None.
         output_dxf : string, optional
-            Output filename. The default is 'array.dxf'.
+            Output filename. When the pixels are read from files it is
+            relative to the parent of input_dxf_path. The default is
+            'array.dxf'.
         feedline_dxf : string, optional
             The path to a .dxf file with the feedline drawing. The drawing must
             be placed on the 'FEEDLINE' layer. The default is None.
@@ -42,71 +60,284 @@ class Array():
             The path to a .dxf file with the wafer perimeter drawing. 
             The drawing must be placed on the 'WAFER_LIMIT' layer. The default 
             is None.
+        instancing : bool, optional
+            If True each distinct pixel drawing is stored once as a DXF block
+            and every pixel is placed as a block reference (INSERT) with its
+            position, rotation and mirroring, while the textual index is still
+            drawn in the modelspace. Pixels with identical geometry share the
+            same block. This gives much smaller files for large arrays. The
+            default is False.
+        workers : int, optional
+            Number of worker processes used to read and place the pixel dxf
+            files in parallel, the current process only merges the placed
+            entities in the array drawing. The output is the same for any
+            number of workers. If None all the CPUs are used. On platforms
+            where the processes are spawned (Windows and Mac OS) the calling
+            script must be protected by an if __name__ == '__main__':
+            statement when more than one worker is used. The default is 1.
+        stream : bool, optional
+            If True the placed pixels are written straight to the output file
+            as soon as they are ready, instead of being collected in the
+            array drawing, so that the memory used does not depend on the
+            number of pixels. The output file is the same, the array drawing
+            (array_dxf) holds only the layers, blocks, feedline and wafer and
+            saveFig reads the array back from the output file. The default is
+            False.
+        manifest : string, optional
+            Path to the json build manifest, ex. './pixels/manifest.json'
+            (it can be the same manifest used by generate_pixels). It
+            records a hash of the pixel files, of the placement and of the
+            feedline and wafer drawings: if none of them changed since the
+            last build the existing output file is reused, array_dxf is None
+            and saveFig reads the array from the output file. Used only when
+            the pixels are read from files. The default is None.
+        profiler : Profiler, optional
+            A Profiler that records the wall time, the entities and vertices
+            and optionally the memory peak of each stage of the assembly
+            (placement, setup, feedline and wafer import, pixels, save_dxf)
+            and of saveFig. The default is None, i.e. no profiling.
+        nodes : iterable of tuples, optional
+            The pixel positions and rotations given in blocks, as
+            (x_pos, y_pos, rotation) tuples of arrays, ex. the blocks of
+            Patterns.circularTriangleLatticeChunks. The blocks are placed one
+            at a time and never joined, so that with stream=True the memory
+            used does not depend on the number of pixels. The placement
+            attributes (placement, x_scale, ...) are None and the manifest is
+            not used. The default is None.
 
         Returns
         -------
         None.
 
         '''
-        self.input_dxf_path = Path(input_dxf_path)
+        if isinstance(input_dxf_path, (str, os.PathLike)):
+            self.input_dxf_path = Path(input_dxf_path)
+            self.pixels = None
+            output_dxf = self.input_dxf_path.parent / output_dxf
+        else:
+            self.input_dxf_path = None
+            self.pixels = list(input_dxf_path)
         self.n_pixels = n_pixels
         self.x_pos = x_pos
         self.y_pos = y_pos
         self.rotation = rotation
         self.mirror = mirror
+        self.instancing = instancing
+        self.stream = stream
+        self.output_dxf = output_dxf
+        self.reused = False
+        # the stages of the assembly are measured by the profiler
+        self.profiler = profiler if profiler is not None else Profiler(enabled=False)
+        # block names of the pixel drawings already defined (instancing only)
+        self.__blocks__ = {}
 
         # check if files exist
-        for i in range(self.n_pixels):
-            file = Path(self.input_dxf_path, 'pixel_{:d}.dxf'.format(i+1))
-            if not exists(file):
-                print("Error. '"+str(file)+"' does not exists.")
-                return None
+        if self.pixels is None:
+            for i in range(self.n_pixels):
+                file = Path(self.input_dxf_path, 'pixel_{:d}.dxf'.format(i+1))
+                if not exists(file):
+                    print("Error. '"+str(file)+"' does not exists.")
+                    return None
+        elif len(self.pixels) < self.n_pixels:
+            print("Error. {:d} pixels given, {:d} expected.".format(len(self.pixels), self.n_pixels))
+            return None
+
+        if nodes is None:
+            with self.profiler.stage('placement', self):
+                # placement of each pixel: mirroring, rotation and translation
+                block = self.__placement(self.x_pos, self.y_pos, self.rotation, self.mirror, self.n_pixels)
+                self.placement, self.x_scale, self.y_scale, self.rotation_angle = block
+            blocks = [(0, block)]
+        else:
+            # the blocks are placed while they are generated
+            self.placement, self.x_scale, self.y_scale, self.rotation_angle = None, None, None, None
+            blocks = self.__node_blocks(nodes)
+
+        # the array is reused if its pixels and placement did not change
+        if manifest is not None:
+            if self.pixels is not None:
+                print("Warning. The manifest is used only when the pixels are read from files.")
+            elif nodes is not None:
+                print("Warning. The manifest is not used when the nodes are given in blocks.")
+                manifest = None
+            else:
+                with self.profiler.stage('manifest', self):
+                    manifest = Manifest(manifest)
+                    digest = self.__inputs_hash(feedline_dxf, wafer_dxf)
+                    key = Path(self.output_dxf).name
+                if not manifest.changed(key, digest, self.output_dxf):
+                    self.reused = True
+                    self.array_dxf = None
+                    return None
+                # the manifest entry is rewritten only after a successful build
+                manifest.update(key, None)
+                manifest.save()
 
         # create the array dxf file
-        self.array_dxf = ezdxf.new('R2018', setup=True)
+        with self.profiler.stage('setup', self):
+            self.array_dxf = new_drawing()
+        msp = self.array_dxf.modelspace()
         
         # import the feedline drawing if given
         if feedline_dxf != None:
-            feedline = ezdxf.readfile(feedline_dxf)
-            importer = Importer(feedline, self.array_dxf)
-            importer.import_modelspace()
-            importer.finalize()
+            with self.profiler.stage('feedline', self, layout=msp):
+                feedline = ezdxf.readfile(feedline_dxf)
+                importer = Importer(feedline, self.array_dxf)
+                importer.import_modelspace()
+                importer.finalize()
             
         # import the wafer limit perimeter
         if wafer_dxf != None:
-            wafer = ezdxf.readfile(wafer_dxf)
-            importer = Importer(wafer, self.array_dxf)
-            importer.import_modelspace()
-            importer.finalize()
+            with self.profiler.stage('wafer', self, layout=msp):
+                wafer = ezdxf.readfile(wafer_dxf)
+                importer = Importer(wafer, self.array_dxf)
+                importer.import_modelspace()
+                importer.finalize()
         
-        for i in range(self.n_pixels):
-            # read pixel dxf files
-            pixel_dxf = ezdxf.readfile(self.input_dxf_path / 'pixel_{:d}.dxf'.format(i+1))
-            for entity in pixel_dxf.modelspace():
-                # the textual index should be translated only
-                # type(entity) == ezdxf.entities.text.Text return True if the
-                # entity is the textual index
-                if not type(entity) == ezdxf.entities.text.Text:
-                    # mirroring
-                    if np.any(self.mirror != None):
-                        if self.mirror[i] == 'x':
-                            entity.transform(ezdxf.math.Matrix44.scale(sx=-1, sy=1, sz=1))
-                        if self.mirror[i] == 'y':
-                            entity.transform(ezdxf.math.Matrix44.scale(sx=1, sy=-1, sz=1))
-                    # rotation
-                    if np.any(self.rotation != None):
-                        entity.transform(ezdxf.math.Matrix44.z_rotate(np.radians(self.rotation[i])))
-                # translation
-                entity.transform(ezdxf.math.Matrix44.translate(self.x_pos[i], self.y_pos[i], 0.0))
-            importer = Importer(pixel_dxf, self.array_dxf)
-            importer.import_modelspace()
-            importer.finalize()
+        # the entities are written to the array drawing or streamed to disk
+        self.__writer__ = None
+        if self.stream:
+            self.__writer__ = StreamWriter(self.output_dxf, self.array_dxf)
+
+        # placed pixels, the streamed entities are counted by the writer
+        with self.profiler.stage('pixels', self, layout=None if self.stream else msp) as record:
+            executor = None
+            if self.pixels is None and workers != 1:
+                if workers is None:
+                    workers = os.cpu_count()
+                executor = ProcessPoolExecutor(max_workers=workers)
+            with executor if executor is not None else nullcontext():
+                for start, block in blocks:
+                    self.__place_pixels(start, block, executor, workers)
+            if self.stream:
+                record['entities'] = self.__writer__.n_entities
 
         # save array dxf file
-        self.array_dxf.saveas(self.input_dxf_path.parent / output_dxf)
+        with self.profiler.stage('save_dxf', self):
+            if self.stream:
+                self.__writer__.close()
+            else:
+                self.array_dxf.saveas(self.output_dxf)
+
+        if manifest is not None and self.pixels is None:
+            manifest.update(key, digest)
+            manifest.save()
+
+    # computes the hash of the inputs of the array
+    def __inputs_hash(self, feedline_dxf, wafer_dxf):
+        from . import __version__
+        files = [self.input_dxf_path / 'pixel_{:d}.dxf'.format(i+1) for i in range(self.n_pixels)]
+        files += [file for file in (feedline_dxf, wafer_dxf) if file is not None]
+        contents = []
+        for file in files:
+            with open(file, 'rb') as f:
+                contents.append(content_hash(f.read()))
+        return content_hash(__version__, self.n_pixels, self.instancing, self.placement, contents)
+
+    # computes the placement of the pixels: mirroring, rotation and translation
+    def __placement(self, x_pos, y_pos, rotation, mirror, n_pixels):
+        x_scale = np.ones(n_pixels)
+        y_scale = np.ones(n_pixels)
+        if np.any(mirror != None):
+            mirror = np.asarray(mirror, dtype=object)[:n_pixels]
+            x_scale[mirror == 'x'] = -1.0
+            y_scale[mirror == 'y'] = -1.0
+        rotation_angle = np.zeros(n_pixels)
+        if np.any(rotation != None):
+            rotation_angle = np.asarray(rotation, dtype=float)[:n_pixels]
+        placement = fc.placement_matrices(np.asarray(x_pos, dtype=float)[:n_pixels],
+                                          np.asarray(y_pos, dtype=float)[:n_pixels],
+                                          rotation_angle, x_scale, y_scale)
+        return placement, x_scale, y_scale, rotation_angle
+
+    # computes the placement of the pixels of each block of nodes
+    def __node_blocks(self, nodes):
+        start = 0
+        for x_pos, y_pos, rotation in nodes:
+            if start >= self.n_pixels:
+                break
+            n_block = min(len(x_pos), self.n_pixels-start)
+            mirror = None if self.mirror is None else self.mirror[start:start+n_block]
+            yield start, self.__placement(x_pos, y_pos, rotation, mirror, n_block)
+            start += n_block
+        if start < self.n_pixels:
+            print("Warning. {:d} nodes given, {:d} expected.".format(start, self.n_pixels))
+
+    # places the pixels of a block
+    def __place_pixels(self, start, block, executor, workers):
+        stop = start+len(block[0])
+        instancing = [self.instancing]*(stop-start)
+        if self.pixels is not None:
+            # pixel objects are left untouched, their entities are copied
+            pixels = ([entity.copy() for entity in self.pixels[i].msp] for i in range(start, stop))
+            layers = (self.pixels[i].dxf.layers for i in range(start, stop))
+            placed_pixels = map(_place_pixel, layers, pixels, block[0], instancing)
+            self.__add_pixels(placed_pixels, block)
+            return
+
+        filenames = [self.input_dxf_path / 'pixel_{:d}.dxf'.format(i+1) for i in range(start, stop)]
+        if executor is None:
+            placed_pixels = map(_load_pixel, filenames, block[0], instancing)
+            self.__add_pixels(placed_pixels, block)
+            return
+
+        chunksize = max(1, len(filenames)//(4*workers))
+        # when streaming, the pixels are submitted in windows so
+        # that the placed pixels waiting to be written are bounded
+        window = len(filenames)
+        if self.stream:
+            window = min(window, 64*workers)
+            chunksize = max(1, min(chunksize, window//(4*workers)))
+        for k in range(0, len(filenames), window):
+            window_block = tuple(values[k:k+window] for values in block)
+            placed_pixels = executor.map(_load_pixel, filenames[k:k+window], window_block[0],
+                                         instancing[k:k+window], chunksize=chunksize)
+            self.__add_pixels(placed_pixels, window_block)
+
+    # adds the placed pixels of a block to the array drawing
+    def __add_pixels(self, placed_pixels, block):
+        placement, x_scale, y_scale, rotation_angle = block
+        msp = self.array_dxf.modelspace()
+        if self.stream:
+            add_entity = self.__writer__.add_entity
+        else:
+            add_entity = lambda entity: _add_entity(msp, entity)
+        for i, (layers, entities) in enumerate(placed_pixels):
+            # add the missing layers
+            for name, attribs in layers:
+                if not self.array_dxf.layers.has_entry(name):
+                    self.array_dxf.layers.new(name, dxfattribs=attribs)
+
+            if not self.instancing:
+                for entity in entities:
+                    add_entity(entity)
+                continue
+
+            # the textual index is different for each pixel and it is
+            # translated only, so it is kept out of the block
+            texts = [entity for entity in entities if entity[0] == 'TEXT']
+            entities = [entity for entity in entities if entity[0] != 'TEXT']
+
+            # define a new block if the pixel drawing was not found yet
+            key = hashlib.sha1(pickle.dumps(entities)).hexdigest()
+            if key not in self.__blocks__:
+                block_name = 'PIXEL_{:d}'.format(len(self.__blocks__)+1)
+                block = self.array_dxf.blocks.new(name=block_name)
+                for entity in entities:
+                    _add_entity(block, entity)
+                self.__blocks__[key] = block_name
+
+            # mirroring, rotation and translation
+            add_entity(('INSERT', {'name': self.__blocks__[key],
+                                   'insert': (placement[i, 0, 2], placement[i, 1, 2], 0.0),
+                                   'xscale': x_scale[i], 'yscale': y_scale[i],
+                                   'rotation': rotation_angle[i]}, None))
+
+            for text in texts:
+                add_entity(text)
 
     # saves the figure of the array
-    def saveFig(self, filename='array.png', dpi=250):
+    def saveFig(self, filename='array.png', dpi=250, show=True):
         '''
         This function saves a figure of the array design.
 
@@ -116,6 +347,9 @@ class Array():
             Output path and filename of the figure. The default is 'array.png'.
         dpi : int, optional
             Dpi of the figure. The default is 250.
+        show : bool, optional
+            If True the figure is also shown with pyplot. The default is
+            True.
 
         Returns
         -------
@@ -127,9 +361,125 @@ class Array():
         if not os.path.exists(filename.parent):
             os.makedirs(filename.parent)
 
-        fig = plt.figure()
-        ax = fig.add_axes([0, 0, 1, 1])
-        backend = MatplotlibBackend(ax)
-        Frontend(RenderContext(self.array_dxf), backend).draw_layout(self.array_dxf.modelspace())
-        fig.savefig(filename, dpi=dpi)
-        plt.show()
+        # a streamed or reused array is not kept in memory
+        array_dxf = self.array_dxf
+        if self.stream or self.reused:
+            array_dxf = ezdxf.readfile(self.output_dxf)
+
+        with self.profiler.stage('saveFig', self):
+            fig = plt.figure()
+            ax = fig.add_axes([0, 0, 1, 1])
+            backend = MatplotlibBackend(ax)
+            Frontend(RenderContext(array_dxf), backend).draw_layout(array_dxf.modelspace())
+            fig.savefig(filename, dpi=dpi)
+        # the figure is closed to release its memory
+        if show:
+            plt.show()
+        plt.close(fig)
+
+    # saves a fast preview figure of the array
+    def savePreview(self, filename='array.png', dpi=250, layers=None, lod=None, fill=False):
+        '''
+        This function saves a fast preview figure of the array design, drawn
+        directly from the polyline coordinates without the ezdxf drawing
+        frontend (see Preview.save_preview). Much faster than saveFig for
+        large arrays.
+
+        Parameters
+        ----------
+        filename : string, optional
+            Output path and filename of the figure. The default is
+            'array.png'.
+        dpi : int, optional
+            Dpi of the figure. The default is 250.
+        layers : list of strings, optional
+            The layers to be drawn, ex. ['PIXEL', 'FEEDLINE']. The default
+            is None, i.e. all the layers.
+        lod : bool, optional
+            Level of detail mode: if True only the PIXEL_AREA boxes, the
+            index labels and the layers that do not belong to the pixels
+            (feedline, wafer, ...) are drawn. If None it is used when the
+            pixels are too small to resolve the lines of the absorbers at
+            the given dpi. The default is None.
+        fill : bool, optional
+            If True the closed polylines are filled. The default is False.
+
+        Returns
+        -------
+        None.
+
+        '''
+        # a streamed or reused array is not kept in memory
+        array_dxf = self.array_dxf
+        if self.stream or self.reused:
+            array_dxf = ezdxf.readfile(self.output_dxf)
+
+        with self.profiler.stage('savePreview', self):
+            save_preview(array_dxf, filename, dpi=dpi, layers=layers, lod=lod, fill=fill)
+
+
+# reads a pixel dxf file and places its entities (executed by the workers)
+def _load_pixel(filename, placement, instancing):
+    pixel_dxf = ezdxf.readfile(filename)
+    return _place_pixel(pixel_dxf.layers, pixel_dxf.modelspace(), placement, instancing)
+
+
+# places the entities of a pixel with a (3, 3) placement matrix and returns
+# them as plain data, together with the definitions of their layers
+def _place_pixel(layers, entities, placement, instancing):
+    placed_entities = []
+    polylines = []
+    for entity in entities:
+        # the textual index should be translated only
+        # type(entity) == ezdxf.entities.text.Text return True if the
+        # entity is the textual index
+        if type(entity) == ezdxf.entities.text.Text:
+            entity.transform(ezdxf.math.Matrix44.translate(placement[0, 2], placement[1, 2], 0.0))
+        # blocks are placed by their references
+        elif not instancing:
+            if entity.dxftype() == 'LWPOLYLINE':
+                polylines.append(len(placed_entities))
+            else:
+                entity.transform(ezdxf.math.Matrix44([placement[0, 0], placement[1, 0], 0.0, 0.0,
+                                                      placement[0, 1], placement[1, 1], 0.0, 0.0,
+                                                      0.0, 0.0, 1.0, 0.0,
+                                                      placement[0, 2], placement[1, 2], 0.0, 1.0]))
+        placed_entities.append(_entity_data(entity))
+
+    # all the polyline vertices are placed together
+    if polylines:
+        points = np.concatenate([placed_entities[k][2] for k in polylines])
+        points[:, :2] = fc.transform_points(points[:, :2], placement)
+        # mirroring reverses the arcs
+        if np.linalg.det(placement[:2, :2]) < 0.0:
+            points[:, 4] *= -1.0
+        sections = np.cumsum([len(placed_entities[k][2]) for k in polylines])[:-1]
+        for k, polyline_points in zip(polylines, np.split(points, sections)):
+            placed_entities[k] = (placed_entities[k][0], placed_entities[k][1], polyline_points)
+
+    layer_names = sorted(set(entity[1]['layer'] for entity in placed_entities if 'layer' in entity[1]))
+    placed_layers = []
+    for name in layer_names:
+        if layers.has_entry(name):
+            attribs = layers.get(name).dxfattribs()
+            placed_layers.append((name, {key: attribs[key] for key in ('flags', 'color', 'linetype', 'lineweight') if key in attribs}))
+    return placed_layers, placed_entities
+
+
+# returns the type, the attributes and the vertices of an entity as plain data
+def _entity_data(entity):
+    attribs = {key: (tuple(value) if isinstance(value, ezdxf.math.Vec3) else value)
+               for key, value in entity.dxfattribs(drop={'handle', 'owner'}).items()}
+    points = None
+    if entity.dxftype() == 'LWPOLYLINE':
+        points = np.array(entity.get_points('xyseb'), dtype=float).reshape(-1, 5)
+    return entity.dxftype(), attribs, points
+
+
+# adds an entity given as plain data to a layout
+def _add_entity(layout, entity):
+    dxftype, attribs, points = entity
+    if dxftype == 'LWPOLYLINE':
+        layout.add_lwpolyline(points, format='xyseb', close=bool(attribs.get('flags', 0) & 1), dxfattribs=attribs)
+    else:
+        layout.new_entity(dxftype, attribs)
@@ -0,0 +1,333 @@
+# KID drawer (DXF file generator) - Federico Cacciotti (c)2022
+
+# import packages
+import os
+import time
+import traceback
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import ezdxf
+from ezdxf.addons.drawing.matplotlib import MatplotlibBackend
+from ezdxf.addons.drawing import Frontend, RenderContext
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from .Manifest import Manifest, content_hash
+from .Preview import draw_preview, PREVIEW_BACKGROUND
+
+
+# generates and saves many pixels in parallel
+def generate_pixels(pixel_class, parameters, output_dxf_path, workers=None, filename='pixel_{:d}.dxf', manifest=None):
+    '''
+    This function generates and saves many pixels in parallel, using a pool
+    of processes. The pixels are scheduled from the most expensive to the
+    cheapest one (the cost is estimated from the hilbert order and the
+    number of fingers) so that the slowest pixels do not end up alone at the
+    end of the run.
+    If a manifest is given only the pixels whose parameters changed (or
+    whose file is missing) are built, the other files are reused.
+    On platforms where the processes are spawned (Windows and Mac OS) the
+    calling script must be protected by an
+    if __name__ == '__main__':
+    statement.
+
+    Parameters
+    ----------
+    pixel_class : class
+        The pixel class, ex. HilbertLShape.
+    parameters : dict of lists or list of dicts
+        The table of the constructor parameters of the pixels, either as a
+        dictionary of equal length lists (one list per parameter) or as a
+        list of dictionaries (one dictionary per pixel). The 'index'
+        parameter is used to name the output files.
+    output_dxf_path : string
+        Path to the output dxf pixel files.
+    workers : int, optional
+        Number of worker processes. If 1 the pixels are generated in the
+        current process. The default is None, i.e. the number of CPUs.
+    filename : string, optional
+        Format string of the output filenames, formatted with the pixel
+        index. The default is 'pixel_{:d}.dxf'.
+    manifest : string, optional
+        Path to the json build manifest, that records a hash of the
+        parameters of each pixel file, ex. './pixels/manifest.json'. If
+        None every pixel is built. The default is None.
+
+    Returns
+    -------
+    results : list of dicts
+        One dictionary per pixel, in the same order of the parameters table,
+        with the following keys:
+            - 'index': the index of the pixel
+            - 'filename': the output dxf file
+            - 'worker': the process id of the worker that built the pixel
+                (None if the worker crashed)
+            - 'time': the time spent to build and save the pixel in seconds
+            - 'error': None or the traceback of the error raised by the
+                worker
+            - 'reused': True if the existing file was reused
+
+    '''
+    rows = parameters_table(parameters)
+    output_dxf_path = Path(output_dxf_path)
+    filenames = [output_dxf_path / filename.format(row['index']) for row in rows]
+
+    results = [None]*len(rows)
+    order = range(len(rows))
+
+    # unchanged pixels are reused
+    if manifest is not None:
+        manifest = Manifest(manifest)
+        digests = [parameters_hash(pixel_class, row) for row in rows]
+        for i in order:
+            if not manifest.changed(filenames[i].name, digests[i], filenames[i]):
+                results[i] = {'index': rows[i].get('index'),
+                              'filename': filenames[i],
+                              'worker': os.getpid(),
+                              'time': 0.0,
+                              'error': None,
+                              'reused': True}
+        order = [i for i in order if results[i] is None]
+
+    # most expensive pixels first
+    order = sorted(order, key=lambda i: pixel_cost(rows[i]), reverse=True)
+
+    if workers == 1:
+        for i in order:
+            results[i] = _build_pixel(pixel_class, rows[i], filenames[i])
+    elif order:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {i: executor.submit(_build_pixel, pixel_class, rows[i], filenames[i]) for i in order}
+            for i, future in futures.items():
+                # a crashed worker or a result that can not be pickled
+                # fails only its pixel
+                try:
+                    results[i] = future.result()
+                except Exception:
+                    results[i] = {'index': rows[i].get('index'),
+                                  'filename': filenames[i],
+                                  'worker': None,
+                                  'time': 0.0,
+                                  'error': traceback.format_exc(),
+                                  'reused': False}
+
+    for result in results:
+        if result['error'] is not None:
+            print("Error. Pixel {} (worker {}) failed:\n{}".format(result['index'], result['worker'], result['error']))
+
+    # only the pixels built without errors are recorded
+    if manifest is not None:
+        for i in order:
+            if results[i]['error'] is None:
+                manifest.update(filenames[i].name, digests[i])
+        manifest.save()
+
+    return results
+
+
+# renders thumbnails of many dxf files in parallel
+def render_thumbnails(dxf_files, output_path, dpi=100, figsize=(2.0, 2.0), layers=None, renderer='preview', workers=None):
+    '''
+    This function renders png thumbnails of many dxf files (ex. the pixel
+    files) in a pool of processes, without any window. Each worker draws all
+    its images on a single figure with an Agg canvas, that is cleared and
+    reused, so the memory does not grow with the number of images.
+
+    Parameters
+    ----------
+    dxf_files : string or list of strings
+        A directory (all its .dxf files are rendered) or a list of dxf
+        files.
+    output_path : string
+        Path to the output images, named after the dxf files
+        ('pixel_1.dxf' -> 'pixel_1.png').
+    dpi : int, optional
+        Dpi of the images. The default is 100.
+    figsize : tuple of floats, optional
+        Size of the images in inches. The default is (2.0, 2.0).
+    layers : list of strings, optional
+        The layers to be drawn (preview renderer only). The default is None,
+        i.e. all the layers.
+    renderer : string, optional
+        'preview' draws the polylines directly as Matplotlib collections
+        (see Preview.draw_preview), 'ezdxf' uses the ezdxf drawing frontend
+        as saveFig does. The default is 'preview'.
+    workers : int, optional
+        Number of worker processes. If 1 the images are rendered in the
+        current process. The default is None, i.e. the number of CPUs.
+
+    Returns
+    -------
+    results : list of dicts
+        One dictionary per image, in the same order of the dxf files, with
+        the following keys:
+            - 'filename': the dxf file
+            - 'image': the output image
+            - 'worker': the process id of the worker that rendered the image
+            - 'time': the time spent to render the image in seconds
+            - 'error': None or the traceback of the error raised by the
+                worker
+
+    '''
+    if renderer not in ('preview', 'ezdxf'):
+        print("Error. Unknown renderer '"+str(renderer)+"', use 'preview' or 'ezdxf'.")
+        return None
+    if isinstance(dxf_files, (str, os.PathLike)):
+        dxf_files = sorted(Path(dxf_files).glob('*.dxf'), key=lambda file: (len(file.stem), file.stem))
+    dxf_files = [Path(file) for file in dxf_files]
+    output_path = Path(output_path)
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+    images = [output_path / (file.stem+'.png') for file in dxf_files]
+
+    n_files = len(dxf_files)
+    options = [(dpi, tuple(figsize), layers, renderer)]*n_files
+    if workers == 1:
+        results = list(map(_render_thumbnail, dxf_files, images, options))
+    else:
+        if workers is None:
+            workers = os.cpu_count()
+        results = [None]*n_files
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_render_thumbnail, dxf_files[i], images[i], options[i]) for i in range(n_files)]
+            for i, future in enumerate(futures):
+                # a crashed worker or a result that can not be pickled
+                # fails only its thumbnail
+                try:
+                    results[i] = future.result()
+                except Exception:
+                    results[i] = {'filename': dxf_files[i],
+                                  'image': images[i],
+                                  'worker': None,
+                                  'time': 0.0,
+                                  'error': traceback.format_exc()}
+
+    for result in results:
+        if result['error'] is not None:
+            print("Error. Thumbnail of '{}' (worker {}) failed:\n{}".format(result['filename'], result['worker'], result['error']))
+
+    return results
+
+
+# converts a table of parameters to a list of dictionaries
+def parameters_table(parameters):
+    '''
+    This function converts a table of pixel parameters to a list of
+    dictionaries, one per pixel.
+
+    Parameters
+    ----------
+    parameters : dict of lists or list of dicts
+        The table of the constructor parameters of the pixels.
+
+    Returns
+    -------
+    list of dicts
+        The constructor parameters of each pixel.
+
+    '''
+    if isinstance(parameters, dict):
+        names = list(parameters.keys())
+        return [dict(zip(names, values)) for values in zip(*parameters.values())]
+    return [dict(row) for row in parameters]
+
+
+# computes the hash of the parameters of a pixel
+def parameters_hash(pixel_class, row):
+    '''
+    This function computes a content hash of the parameters of a pixel,
+    together with its class and the package version.
+
+    Parameters
+    ----------
+    pixel_class : class
+        The pixel class, ex. HilbertLShape.
+    row : dict
+        The constructor parameters of the pixel.
+
+    Returns
+    -------
+    string
+        The hexadecimal sha1 digest.
+
+    '''
+    from . import __version__
+    return content_hash(__version__, pixel_class.__module__+'.'+pixel_class.__qualname__, row)
+
+
+# estimates the relative cost of a pixel
+def pixel_cost(row):
+    '''
+    This function estimates the relative cost of building a pixel from its
+    parameters, as the number of vertices of its absorber and capacitor.
+
+    Parameters
+    ----------
+    row : dict
+        The constructor parameters of the pixel.
+
+    Returns
+    -------
+    float
+        The estimated cost.
+
+    '''
+    cost = 1.0
+    # invalid parameters are left to the worker, that reports the error
+    try:
+        cost += 4.0**float(row.get('hilbert_order', 0.0))
+        cost += 8.0*float(row.get('capacitor_finger_number', 0.0))
+    except (TypeError, ValueError):
+        pass
+    return cost
+
+
+# builds and saves a single pixel (executed by the workers)
+def _build_pixel(pixel_class, row, filename):
+    start = time.perf_counter()
+    error = None
+    try:
+        pixel_class(**row).save_dxf(filename)
+    except Exception:
+        error = traceback.format_exc()
+    return {'index': row.get('index'),
+            'filename': filename,
+            'worker': os.getpid(),
+            'time': time.perf_counter()-start,
+            'error': error,
+            'reused': False}
+
+
+# figure reused by all the thumbnails rendered by a process
+_thumbnail_figure = None
+
+
+# renders a single thumbnail (executed by the workers)
+def _render_thumbnail(filename, image, options):
+    global _thumbnail_figure
+    dpi, figsize, layers, renderer = options
+    start = time.perf_counter()
+    error = None
+    try:
+        # the figure and its Agg canvas are created once per process
+        if _thumbnail_figure is None:
+            _thumbnail_figure = Figure()
+            FigureCanvasAgg(_thumbnail_figure)
+        fig = _thumbnail_figure
+        fig.clear()
+        fig.set_size_inches(figsize)
+        ax = fig.add_axes([0, 0, 1, 1])
+        drawing = ezdxf.readfile(filename)
+        if renderer == 'preview':
+            draw_preview(ax, drawing, layers=layers, lod=False, dpi=dpi)
+            fig.savefig(image, dpi=dpi, facecolor=PREVIEW_BACKGROUND)
+        else:
+            Frontend(RenderContext(drawing), MatplotlibBackend(ax)).draw_layout(drawing.modelspace())
+            fig.savefig(image, dpi=dpi)
+        fig.clear()
+    except Exception:
+        error = traceback.format_exc()
+    return {'filename': filename,
+            'image': image,
+            'worker': os.getpid(),
+            'time': time.perf_counter()-start,
+            'error': error}
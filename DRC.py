@@ -0,0 +1,230 @@
+# KID drawer (DXF file generator) - Federico Cacciotti (c)2022
+
+# import packages
+import ezdxf
+import numpy as np
+import shapely
+from .Preview import layout_geometry
+
+# tolerance in microns of the containment checks
+DRC_TOLERANCE = 1e-6
+
+
+# checks the design rules of an array
+def design_rule_check(array, min_spacing, feedline_spacing=None, feedline_width=0.0, wafer_margin=0.0,
+                      metal_layers=('PIXEL',), feedline_layers=('FEEDLINE',), wafer_layers=('WAFER_LIMIT', 'WAFER_LIMITS'),
+                      verbose=True):
+    '''
+    This function checks the design rules of an array: the spacing between
+    the metal of different pixels, the containment of the metal of each
+    pixel in its PIXEL_AREA box and in the wafer limit and the spacing from
+    the feedline. The geometries of each layer are indexed by a shapely
+    STRtree, so that only the neighbouring geometries are compared and the
+    check scales as O(n log n) with the number of pixels.
+    The pixels are identified from the order of the entities of the
+    drawing: the array writes the entities of each pixel (or its block
+    reference) one after the other, ending with its textual index (INDEX
+    layer). If the drawing has no index, each entity or block reference is
+    a pixel.
+
+    Parameters
+    ----------
+    array : Array, ezdxf.document.Drawing or string
+        The array, its dxf drawing or the path to its dxf file. Block
+        references (instancing) are expanded.
+    min_spacing : float
+        Minimum distance in microns between the metal of different pixels.
+    feedline_spacing : float, optional
+        Minimum distance in microns between the metal of the pixels and the
+        feedline. If None only the overlaps with the feedline are checked.
+        The default is None.
+    feedline_width : float, optional
+        Width of the feedline in microns, if the feedline drawing is its
+        centerline. The default is 0.0.
+    wafer_margin : float, optional
+        Minimum distance in microns between the metal of the pixels and the
+        wafer limit. The default is 0.0.
+    metal_layers : tuple of strings, optional
+        The layers of the metal of the pixels. The default is ('PIXEL',).
+    feedline_layers : tuple of strings, optional
+        The layers of the feedline. The default is ('FEEDLINE',).
+    wafer_layers : tuple of strings, optional
+        The layers of the wafer limit. The default is ('WAFER_LIMIT',
+        'WAFER_LIMITS').
+    verbose : bool, optional
+        If True the violations are printed on screen. The default is True.
+
+    Returns
+    -------
+    violations : list of dicts
+        One dictionary per violation, with the following keys:
+            - 'rule': 'overlap', 'spacing', 'containment', 'wafer' or
+                'feedline'
+            - 'pixels': tuple of the indices of the pixels involved (None
+                if a pixel has no index)
+            - 'location': (x, y) coordinates of the violation in microns
+            - 'distance': the distance in microns between the geometries
+                (0.0 for overlaps and containment errors)
+
+    '''
+    drawing = _array_drawing(array)
+    if drawing is None:
+        return None
+    geometry, groups = _pixel_geometry(drawing)
+
+    def layer_items(layers, key):
+        return [points for layer in layers if layer in geometry for points in geometry[layer][key]]
+
+    def layer_groups(layers, key):
+        return [group for layer in layers if layer in groups for group in groups[layer][key]]
+
+    metal = shapely.polygons([shapely.linearrings(points) for points in layer_items(metal_layers, 'polygons')])
+    if len(metal) == 0:
+        print("Error. No metal found on the layers "+str(list(metal_layers))+".")
+        return None
+    # pixel of each metal polygon
+    owner = np.array(layer_groups(metal_layers, 'polygons'), dtype=int)
+
+    # PIXEL_AREA box and textual index of each pixel
+    boxes = shapely.polygons([shapely.linearrings(points) for points in layer_items(('PIXEL_AREA',), 'polygons')])
+    pixel_box = {}
+    for k, group in enumerate(layer_groups(('PIXEL_AREA',), 'polygons')):
+        pixel_box.setdefault(group, k)
+    pixel_index = {group: _pixel_index(text[3]) for group, text in zip(layer_groups(('INDEX',), 'texts'),
+                                                                       layer_items(('INDEX',), 'texts'))}
+    indices = [pixel_index.get(group) for group in owner]
+
+    violations = []
+
+    # spacing and overlaps between the metal of different pixels
+    tree = shapely.STRtree(metal)
+    if min_spacing > 0.0:
+        pairs = tree.query(metal, predicate='dwithin', distance=min_spacing)
+    else:
+        pairs = tree.query(metal, predicate='intersects')
+    pairs = pairs[:, (pairs[0] < pairs[1]) & (owner[pairs[0]] != owner[pairs[1]])]
+    distances = shapely.distance(metal[pairs[0]], metal[pairs[1]])
+    close = (distances < min_spacing) | (distances == 0.0)
+    pairs, distances = pairs[:, close], distances[close]
+    locations = _locations(metal[pairs[0]], metal[pairs[1]])
+    for i, j, distance, location in zip(pairs[0], pairs[1], distances, locations):
+        violations.append({'rule': 'overlap' if distance == 0.0 else 'spacing',
+                           'pixels': (indices[i], indices[j]),
+                           'location': location,
+                           'distance': float(distance)})
+
+    # containment of the metal in the PIXEL_AREA box of its pixel
+    boxed = np.array([group in pixel_box for group in owner], dtype=bool)
+    if np.any(boxed):
+        metal_box = np.array([pixel_box[group] for group in owner[boxed]], dtype=int)
+        outside = ~shapely.contains(shapely.buffer(boxes[metal_box], DRC_TOLERANCE), metal[boxed])
+        for i, box in zip(np.nonzero(boxed)[0][outside], metal_box[outside]):
+            violations.append({'rule': 'containment',
+                               'pixels': (indices[i],),
+                               'location': _centroid(shapely.difference(metal[i], boxes[box])),
+                               'distance': 0.0})
+
+    # containment of the metal in the wafer limit
+    wafer = layer_items(wafer_layers, 'polygons')+layer_items(wafer_layers, 'lines')
+    if wafer:
+        limit = shapely.union_all(shapely.polygons([shapely.linearrings(points) for points in wafer if len(points) > 2]))
+        limit = shapely.buffer(limit, DRC_TOLERANCE-wafer_margin)
+        shapely.prepare(limit)
+        outside = ~shapely.contains(limit, metal)
+        for i in np.nonzero(outside)[0]:
+            violations.append({'rule': 'wafer',
+                               'pixels': (indices[i],),
+                               'location': _centroid(shapely.difference(metal[i], limit)),
+                               'distance': float(shapely.distance(metal[i], shapely.boundary(limit)))})
+
+    # spacing from the feedline
+    feedline = [shapely.LineString(points) for points in layer_items(feedline_layers, 'lines')]
+    feedline += [shapely.Polygon(points) for points in layer_items(feedline_layers, 'polygons')]
+    if feedline:
+        feedline = np.array(feedline, dtype=object)
+        clearance = (feedline_spacing or 0.0)+0.5*feedline_width
+        if clearance > 0.0:
+            pairs = tree.query(feedline, predicate='dwithin', distance=clearance)
+        else:
+            pairs = tree.query(feedline, predicate='intersects')
+        distances = shapely.distance(feedline[pairs[0]], metal[pairs[1]])-0.5*feedline_width
+        close = (distances < (feedline_spacing or 0.0)) | (distances <= 0.0)
+        pairs, distances = pairs[:, close], np.maximum(distances[close], 0.0)
+        locations = _locations(metal[pairs[1]], feedline[pairs[0]])
+        for i, distance, location in zip(pairs[1], distances, locations):
+            violations.append({'rule': 'feedline',
+                               'pixels': (indices[i],),
+                               'location': location,
+                               'distance': float(distance)})
+
+    if verbose:
+        for violation in violations:
+            print("Warning. DRC {:s} violation, pixels {:s} at ({:.3f}, {:.3f}), distance {:.3f} microns.".format(
+                violation['rule'], ', '.join(str(index) for index in violation['pixels']),
+                *violation['location'], violation['distance']))
+        print("DRC completed, {:d} violations found.".format(len(violations)))
+
+    return violations
+
+
+# returns the dxf drawing of an array
+def _array_drawing(array):
+    if isinstance(array, ezdxf.document.Drawing):
+        return array
+    if isinstance(array, str) or hasattr(array, '__fspath__'):
+        return ezdxf.readfile(array)
+    # a streamed or reused array is not kept in memory
+    if getattr(array, 'stream', False) or getattr(array, 'reused', False):
+        return ezdxf.readfile(array.output_dxf)
+    if getattr(array, 'array_dxf', None) is None:
+        print("Error. The array has no drawing.")
+        return None
+    return array.array_dxf
+
+
+# returns the geometry of a drawing grouped by layer and the pixel of each item
+def _pixel_geometry(drawing, index_layer='INDEX'):
+    msp = drawing.modelspace()
+    indexed = any(entity.dxftype() == 'TEXT' and entity.dxf.layer == index_layer for entity in msp)
+    geometry, groups, blocks = {}, {}, {}
+    group = 0
+    for entity in msp:
+        for layer, data in layout_geometry([entity], drawing, blocks).items():
+            target = geometry.setdefault(layer, {'polygons': [], 'lines': [], 'texts': []})
+            target_groups = groups.setdefault(layer, {'polygons': [], 'lines': [], 'texts': []})
+            for key, items in data.items():
+                target[key] += items
+                target_groups[key] += [group]*len(items)
+        # the textual index is the last entity of a pixel
+        if not indexed or (entity.dxftype() == 'TEXT' and entity.dxf.layer == index_layer):
+            group += 1
+    return geometry, groups
+
+
+# converts a textual index to an integer
+def _pixel_index(text):
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
+# returns the centroid of a geometry as a tuple
+def _centroid(geometry):
+    if shapely.is_empty(geometry):
+        return (np.nan, np.nan)
+    point = shapely.centroid(geometry)
+    return (float(shapely.get_x(point)), float(shapely.get_y(point)))
+
+
+# returns the locations of the violations between pairs of geometries
+def _locations(geometries_a, geometries_b):
+    locations = []
+    for a, b in zip(geometries_a, geometries_b):
+        if shapely.intersects(a, b):
+            locations.append(_centroid(shapely.intersection(a, b)))
+        else:
+            # midpoint of the shortest line between the geometries
+            x, y = shapely.get_coordinates(shapely.shortest_line(a, b)).mean(axis=0)
+            locations.append((float(x), float(y)))
+    return locations
@@ -0,0 +1,164 @@
+# KID drawer (DXF file generator) - Federico Cacciotti (c)2022
+
+# import packages
+import ezdxf
+
+# header variables that are unique to each drawing
+UNIQUE_HEADER_VARIABLES = ('$HANDSEED', '$FINGERPRINTGUID', '$VERSIONGUID', '$TDCREATE', '$TDUCREATE',
+                           '$TDUPDATE', '$TDUUPDATE', '$TDINDWG', '$TDUSRTIMER')
+
+# templates built by the current process
+_templates = {}
+# the drawings are copied from the templates only if enabled by use_templates
+_copy_templates = False
+
+
+# returns a new drawing copied from a template
+def new_drawing(layers=(), dxfversion='R2018'):
+    '''
+    This function returns a new dxf drawing set up as
+    ezdxf.new(dxfversion, setup=True) (linetypes, text styles, dimension
+    styles, arrow blocks and visual styles) with some layers.
+    If the templates are enabled (see use_templates) the template drawing
+    is built only once per process for each set of layers and each new
+    drawing is a copy of it: the table entries, blocks and objects of the
+    template are already validated, so copying them is much cheaper than
+    setting them up again. The copy relies on the internals of ezdxf 0.17:
+    if it fails the drawings are set up from scratch with ezdxf.new.
+
+    Parameters
+    ----------
+    layers : tuple of tuples, optional
+        The layers of the drawing as (name, color) pairs, where color is an
+        AutoCAD Color Index, ex. (('PIXEL', 255), ('CENTER', 120)). The
+        default is (), i.e. only the default layers.
+    dxfversion : string, optional
+        The dxf version of the drawing. The default is 'R2018'.
+
+    Returns
+    -------
+    ezdxf.document.Drawing
+        The new drawing.
+
+    '''
+    key = (dxfversion, tuple((name, color) for name, color in layers))
+    if not _copy_templates:
+        return _setup_drawing(*key)
+    if key not in _templates:
+        _templates[key] = _build_template(*key)
+    # the template is None if it could not be copied
+    if _templates[key] is not None:
+        try:
+            return _copy_template(*_templates[key])
+        except Exception as error:
+            print("Warning. The dxf template can not be copied ({:s}), the drawings are set up from scratch.".format(repr(error)))
+            _templates[key] = None
+    return _setup_drawing(*key)
+
+
+# copies a template drawing
+def _copy_template(template, header):
+    doc = ezdxf.new(template.dxfversion)
+    for name, value in header.items():
+        doc.header[name] = value
+    # table entries
+    for table in ('linetypes', 'styles', 'dimstyles', 'layers'):
+        source, target = getattr(template, table), getattr(doc, table)
+        for entry in source:
+            if not target.has_entry(entry.dxf.name):
+                target.add_entry(_copy_entity(entry, doc))
+    # blocks, ex. the arrows of the dimension styles
+    for block in template.blocks:
+        if block.name not in doc.blocks:
+            target = doc.blocks.new(block.name, base_point=block.block.dxf.base_point)
+            for entity in block:
+                target.add_entity(_copy_entity(entity, doc))
+    # visual styles
+    source = template.rootdict.get_required_dict('ACAD_VISUALSTYLE')
+    target = doc.rootdict.get_required_dict('ACAD_VISUALSTYLE')
+    for name, style in source.items():
+        if name not in target:
+            style = _copy_entity(style, doc)
+            style.dxf.owner = target.dxf.handle
+            style.set_reactors([target.dxf.handle])
+            doc.objects.add_object(style)
+            target[name] = style
+    return doc
+
+
+# enables the copies of the template drawings
+def use_templates(enabled=True):
+    '''
+    This function enables or disables the copies of the template drawings
+    in new_drawing for the current process. The copies are faster than
+    ezdxf.new(setup=True) but they rely on the internals of ezdxf and they
+    are tested with ezdxf >=0.17.2,<0.18 only, so they are disabled by
+    default. Worker processes (ex. of generate_pixels) inherit the setting
+    only on the platforms where the processes are forked (Linux).
+
+    Parameters
+    ----------
+    enabled : bool, optional
+        If True the drawings are copied from the templates, otherwise they
+        are set up with ezdxf.new(setup=True). The default is True.
+
+    Returns
+    -------
+    None.
+
+    '''
+    global _copy_templates
+    _copy_templates = enabled
+
+
+# clears the templates of the current process
+def clear_templates():
+    '''
+    This function clears the templates built by new_drawing in the current
+    process.
+
+    Returns
+    -------
+    None.
+
+    '''
+    _templates.clear()
+
+
+# builds a template drawing and its header variables
+def _build_template(dxfversion, layers):
+    template = _setup_drawing(dxfversion, layers)
+    # header variables changed by the setup
+    default = ezdxf.new(dxfversion).header
+    header = {name: template.header[name] for name in template.header.varnames()
+              if name not in UNIQUE_HEADER_VARIABLES and default.get(name) != template.header[name]}
+    return template, header
+
+
+# sets up a new drawing with some layers
+def _setup_drawing(dxfversion, layers):
+    doc = ezdxf.new(dxfversion, setup=True)
+    for name, color in layers:
+        doc.layers.add(name=name, color=color)
+    return doc
+
+
+# copies an entity of the template to a drawing
+def _copy_entity(entity, doc):
+    # internal api of ezdxf 0.17, imported here so that a change of the api
+    # falls back to ezdxf.new
+    from ezdxf.entities import factory
+    from ezdxf.entities.ltype import LinetypePattern
+    from ezdxf.lldxf.tags import Tags
+    # the dxf attributes are copied without validating them again
+    copy = entity.__class__()
+    copy.doc = doc
+    copy.dxf = entity.dxf.copy(copy)
+    copy.dxf.reset_handles()
+    if entity.dxftype() == 'LTYPE':
+        # the tags of the pattern are immutable and do not need a deep copy
+        copy.pattern_tags = LinetypePattern(Tags(entity.pattern_tags.tags))
+    else:
+        entity._copy_data(copy)
+    factory.bind(copy, doc)
+    return copy
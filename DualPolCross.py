@@ -3,21 +3,20 @@
 #
 
 # import packages
-import ezdxf
 from ezdxf.addons.drawing.matplotlib import MatplotlibBackend
 from ezdxf.addons.drawing import Frontend, RenderContext
 import numpy as np
 import os
 from pathlib import Path
 from matplotlib import pyplot as plt
-from shapely.geometry import Polygon
-from shapely.ops import unary_union
-from . import functions as fc
+from .Profiler import Profiler
+from .DocumentTemplate import new_drawing
+from .Preview import save_preview
 
 
 # units: micron
 class DualPolCross():
-    def __init__(self, index, h, l, d, w, capacitor_connector_w, capacitor_connector_h):
+    def __init__(self, index, h, l, d, w, capacitor_connector_w, capacitor_connector_h, profiler=None):
 
         self.index = index
         self.h = h
@@ -39,38 +38,43 @@ class DualPolCross():
                                             self.d,
                                             self.w))
         
-        # Create a new DXF R2018 drawing
-        self.dxf = ezdxf.new('R2018', setup=True)
-        # layer names
-        self.pixel_layer_name = "PIXEL"
-        self.center_layer_name = "CENTER"
-        self.pixel_area_layer_name = "PIXEL_AREA"
-        self.absorber_area_layer_name = "ABSORBER_AREA"
-        self.index_layer_name = "INDEX"
-        # layer colors - AutoCAD Color Index - table on http://gohtx.com/acadcolors.php
-        self.pixel_layer_color = 255
-        self.pixel_area_layer_color = 140
-        self.absorber_area_layer_color = 150
-        self.center_layer_color = 120
-        self.index_layer_color = 254
-
-        # adds layers
-        self.dxf.layers.add(name=self.pixel_layer_name, color=self.pixel_layer_color)
-        self.dxf.layers.add(name=self.center_layer_name, color=self.center_layer_color)
-        self.dxf.layers.add(name=self.pixel_area_layer_name, color=self.pixel_area_layer_color)
-        self.dxf.layers.add(name=self.absorber_area_layer_name, color=self.absorber_area_layer_color)
-        self.dxf.layers.add(name=self.index_layer_name, color=self.index_layer_color)
-
-        # adds a modelspace
-        self.msp = self.dxf.modelspace()
+        # the stages of the construction are measured by the profiler
+        self.profiler = profiler if profiler is not None else Profiler(enabled=False)
+
+        with self.profiler.stage('setup', self):
+            # layer names
+            self.pixel_layer_name = "PIXEL"
+            self.center_layer_name = "CENTER"
+            self.pixel_area_layer_name = "PIXEL_AREA"
+            self.absorber_area_layer_name = "ABSORBER_AREA"
+            self.index_layer_name = "INDEX"
+            # layer colors - AutoCAD Color Index - table on http://gohtx.com/acadcolors.php
+            self.pixel_layer_color = 255
+            self.pixel_area_layer_color = 140
+            self.absorber_area_layer_color = 150
+            self.center_layer_color = 120
+            self.index_layer_color = 254
+
+            # Create a new DXF R2018 drawing with the layers of the pixel
+            self.dxf = new_drawing(((self.pixel_layer_name, self.pixel_layer_color),
+                                    (self.center_layer_name, self.center_layer_color),
+                                    (self.pixel_area_layer_name, self.pixel_area_layer_color),
+                                    (self.absorber_area_layer_name, self.absorber_area_layer_color),
+                                    (self.index_layer_name, self.index_layer_color)))
+
+            # adds a modelspace
+            self.msp = self.dxf.modelspace()
 
         # list of all the polygons that draw the whole pixel
         self.__pixel_polygons__ = []
 
         # draw the pixel
-        self.__draw_absorber()
-        self.__draw_capacitor_connetor()
-        self.__draw_index()
+        with self.profiler.stage('absorber', self, layout=self.msp):
+            self.__draw_absorber()
+        with self.profiler.stage('capacitor_connector', self, layout=self.msp):
+            self.__draw_capacitor_connetor()
+        with self.profiler.stage('index', self, layout=self.msp):
+            self.__draw_index()
 
 
 
@@ -170,10 +174,11 @@ class DualPolCross():
         if not os.path.exists(filename.parent):
             os.makedirs(filename.parent)
 
-        self.dxf.saveas(filename)
+        with self.profiler.stage('save_dxf', self):
+            self.dxf.saveas(filename)
 
     # saves the figure of a pixel
-    def saveFig(self, filename, dpi=250):
+    def saveFig(self, filename, dpi=250, show=True):
         '''
         This function saves a figure of the array design.
         
@@ -183,6 +188,9 @@ class DualPolCross():
             Output path and filename of the figure.
         dpi : int, optional
             Dpi of the figure. The default is 250.
+        show : bool, optional
+            If True the figure is also shown with pyplot. The default is
+            True.
                 
         Returns
         -------
@@ -194,9 +202,40 @@ class DualPolCross():
         if not os.path.exists(filename.parent):
             os.makedirs(filename.parent)
 
-        fig = plt.figure()
-        ax = fig.add_axes([0, 0, 1, 1])
-        backend = MatplotlibBackend(ax)
-        Frontend(RenderContext(self.dxf), backend).draw_layout(self.msp)
-        fig.savefig(filename, dpi=dpi)
-        plt.show()
+        with self.profiler.stage('saveFig', self):
+            fig = plt.figure()
+            ax = fig.add_axes([0, 0, 1, 1])
+            backend = MatplotlibBackend(ax)
+            Frontend(RenderContext(self.dxf), backend).draw_layout(self.msp)
+            fig.savefig(filename, dpi=dpi)
+        # the figure is closed to release its memory
+        if show:
+            plt.show()
+        plt.close(fig)
+
+    # saves a fast preview figure of the pixel
+    def savePreview(self, filename, dpi=250, layers=None, fill=False):
+        '''
+        This function saves a fast preview figure of the pixel, drawn
+        directly from the polyline coordinates without the ezdxf drawing
+        frontend (see Preview.save_preview).
+
+        Parameters
+        ----------
+        filename : string
+            Output path and filename of the figure.
+        dpi : int, optional
+            Dpi of the figure. The default is 250.
+        layers : list of strings, optional
+            The layers to be drawn, ex. ['PIXEL', 'INDEX']. The default is
+            None, i.e. all the layers.
+        fill : bool, optional
+            If True the closed polylines are filled. The default is False.
+
+        Returns
+        -------
+        None.
+
+        '''
+        with self.profiler.stage('savePreview', self):
+            save_preview(self.dxf, filename, dpi=dpi, layers=layers, lod=False, fill=fill)
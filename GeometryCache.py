@@ -0,0 +1,176 @@
+# KID drawer (DXF file generator) - Federico Cacciotti (c)2022
+
+# import packages
+import numpy as np
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+from .Manifest import content_hash
+
+# maximum size of a geometry cache directory in bytes
+GEOMETRY_CACHE_SIZE = 256*1024**2
+
+class GeometryCache():
+    def __init__(self, directory, max_size=None):
+        '''
+        This class is a persistent on-disk cache of pixel geometries. Each
+        entry is the list of the polylines of a pixel (layer name and
+        vertices) saved as a compressed numpy archive (.npz), named after a
+        hash of the pixel parameters and of the package version. When the
+        directory grows above max_size the least recently used entries are
+        removed. The cache can be shared by many processes.
+
+        Parameters
+        ----------
+        directory : string
+            Path to the cache directory. It is created if it does not exist.
+        max_size : int, optional
+            Maximum size of the cache directory in bytes. The default is
+            None, i.e. GEOMETRY_CACHE_SIZE (256 MB).
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.directory = Path(directory)
+        self.max_size = GEOMETRY_CACHE_SIZE if max_size is None else max_size
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+
+    # computes the key of a cache entry
+    def key(self, *items):
+        '''
+        This function computes the key of a cache entry from the pixel class
+        name and parameters. The package version is always included, so that
+        a new version never reads stale geometries.
+
+        Parameters
+        ----------
+        *items : any
+            The inputs of the geometry, ex. the class name and a dictionary
+            of parameters.
+
+        Returns
+        -------
+        string
+            The hexadecimal key.
+
+        '''
+        from . import __version__
+        return content_hash(__version__, *items)
+
+    # reads a cache entry
+    def load(self, key):
+        '''
+        This function reads a cache entry.
+
+        Parameters
+        ----------
+        key : string
+            The key of the entry.
+
+        Returns
+        -------
+        list of tuples or None
+            The polylines as (layer name, (N, 2) numpy.ndarray of vertices)
+            tuples, in drawing order, or None if the entry is not cached.
+
+        '''
+        filename = self.directory / (key+'.npz')
+        try:
+            with np.load(filename) as archive:
+                layers = archive['layers']
+                polylines = [(str(layer), archive['polyline_{:d}'.format(i)]) for i, layer in enumerate(layers)]
+            # the access time is tracked by the modification time
+            os.utime(filename)
+        except FileNotFoundError:
+            # missing or evicted entry
+            return None
+        except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+            # corrupted entry, it is removed so that it is built again
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            return None
+        return polylines
+
+    # writes a cache entry
+    def save(self, key, polylines):
+        '''
+        This function writes a cache entry and removes the least recently
+        used entries if the cache is larger than max_size.
+
+        Parameters
+        ----------
+        key : string
+            The key of the entry.
+        polylines : list of tuples
+            The polylines as (layer name, vertices) tuples.
+
+        Returns
+        -------
+        None.
+
+        '''
+        arrays = {'polyline_{:d}'.format(i): np.asarray(points, dtype=float) for i, (layer, points) in enumerate(polylines)}
+        arrays['layers'] = np.array([layer for layer, points in polylines], dtype=str)
+        # the entry is written to a temporary file and then renamed, so that
+        # other processes never read a partial entry
+        file = tempfile.NamedTemporaryFile(dir=self.directory, suffix='.tmp', delete=False)
+        try:
+            with file:
+                np.savez_compressed(file, **arrays)
+            os.replace(file.name, self.directory / (key+'.npz'))
+        except OSError:
+            if os.path.exists(file.name):
+                os.remove(file.name)
+            print("Warning. The geometry cache entry '"+key+"' could not be written.")
+            return
+        self.evict()
+
+    # removes the least recently used entries
+    def evict(self):
+        '''
+        This function removes the least recently used entries until the
+        cache is not larger than max_size.
+
+        Returns
+        -------
+        None.
+
+        '''
+        entries = []
+        for filename in self.directory.glob('*.npz'):
+            try:
+                stat = filename.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, filename))
+        size = sum(entry[1] for entry in entries)
+        for mtime, file_size, filename in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            size -= file_size
+
+    # removes all the entries
+    def clear(self):
+        '''
+        This function removes all the entries of the cache.
+
+        Returns
+        -------
+        None.
+
+        '''
+        for filename in self.directory.glob('*.npz'):
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
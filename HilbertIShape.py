@@ -19,15 +19,19 @@
 #
 
 # import packages
-import ezdxf
 from ezdxf.addons.drawing.matplotlib import MatplotlibBackend
 from ezdxf.addons.drawing import Frontend, RenderContext
 import numpy as np
 import os
 from pathlib import Path
 from matplotlib import pyplot as plt
-from shapely.geometry import Polygon
-from shapely.ops import unary_union
+import shapely
+from . import functions as fc
+from .GeometryCache import GeometryCache
+from .Profiler import Profiler
+from .DocumentTemplate import new_drawing
+from .Preview import save_preview
+from .Resonator import inductor_length
 
 
 # units: micron
@@ -47,15 +51,28 @@ class HilbertIShape():
 			with decimal digits meaning a extra finger of variable length
 		capacitor_finger_gap: float, gap between interdigitated fingers
 		capacitor_finger_width: float, width of the interdigitated fingers
-		hilbert_order: int, hilbert order of the absorber (it is reccommended to not
-			exceed the 7th order for computational reasons)
+		hilbert_order: int, hilbert order of the absorber (also the 16 mm absorbers
+			of order 10 are drawn in less than a second, but their dxf files are large)
 		absorber_separation: float, horizontal separation of the absorber from the
 			capacitor
+		cache_dir: string or GeometryCache, path to a persistent geometry cache
+			directory or a GeometryCache, the geometry of a pixel already drawn
+			with the same parameters (except the index) is read from the cache
+			(default None)
+		cache_size: int, maximum size of the cache directory in bytes when
+			cache_dir is a path (default None, i.e. GEOMETRY_CACHE_SIZE, 256 MB)
+		profiler: Profiler, records the wall time, the vertices, the entities and
+			optionally the memory peak of each stage of the construction and of
+			save_dxf, saveFig and savePreview (default None, i.e. no profiling)
+		lazy: bool, if True only the geometry of the layers is computed and the
+			ezdxf drawing is created on the first access to dxf or msp, so that
+			the metrics of many pixels (bounding_box, metal_area, line_length)
+			and savePreview do not need ezdxf (default False)
 	See other function help for more info
 	'''
     def __init__(self, index, vertical_size, line_width, coupling_capacitor_length, coupling_capacitor_width,
                  coupling_connector_width, coupling_capacitor_y_offset, capacitor_finger_number,
-                 capacitor_finger_gap, capacitor_finger_width, hilbert_order, absorber_separation):
+                 capacitor_finger_gap, capacitor_finger_width, hilbert_order, absorber_separation, cache_dir=None, cache_size=None, profiler=None, lazy=False):
         self.index = index
         self.vertical_size = vertical_size
         self.line_width = line_width
@@ -99,8 +116,9 @@ class HilbertIShape():
                                         self.hilbert_order,
                                         self.absorber_separation))
 
-        # Create a new DXF R2018 drawing
-        self.dxf = ezdxf.new('R2018', setup=True)
+        # the stages of the construction are measured by the profiler
+        self.profiler = profiler if profiler is not None else Profiler(enabled=False)
+
         # layer names
         self.pixel_layer_name = "PIXEL"
         self.center_layer_name = "CENTER"
@@ -113,158 +131,192 @@ class HilbertIShape():
         self.absorber_area_layer_color = 150
         self.center_layer_color = 120
         self.index_layer_color = 254
-        # adds layers
-        self.dxf.layers.add(name=self.pixel_layer_name, color=self.pixel_layer_color)
-        self.dxf.layers.add(name=self.center_layer_name, color=self.center_layer_color)
-        self.dxf.layers.add(name=self.pixel_area_layer_name, color=self.pixel_area_layer_color)
-        self.dxf.layers.add(name=self.absorber_area_layer_name, color=self.absorber_area_layer_color)
-        self.dxf.layers.add(name=self.index_layer_name, color=self.index_layer_color)
 
-        # adds a modelspace
-        self.msp = self.dxf.modelspace()
+        # the ezdxf drawing is created by __materialize
+        self.__dxf__ = None
 
-        # list of all the polygons that draw the whole pixel
+        # list of all the polygons that draw the pixel around the absorber
         self.__pixel_polygons__ = []
+        # combs of the interdigital capacitor
+        self.__capacitor_polygons__ = []
+        # vertices of the absorber outline
+        self.__absorber_outline__ = None
 
-    # draws a lwpolyline from a list of points
+        # center position of the absorber
+        self.absorber_center = (-0.5*self.vertical_size-
+                                self.absorber_separation-
+                                int(self.capacitor_finger_number)*self.capacitor_finger_width-
+                                int(self.capacitor_finger_number-1)*self.capacitor_finger_gap,
+                                -0.5*self.vertical_size)
+
+        # list of all the polylines (layer and points) of the pixel, the
+        # geometry does not depend on the index so it is read from the cache
+        # if the same pixel was already drawn
+        self.__polylines__ = None
+        if cache_dir is not None:
+            with self.profiler.stage('cache_load', self):
+                cache = cache_dir if isinstance(cache_dir, GeometryCache) else GeometryCache(cache_dir, cache_size)
+                key = cache.key(type(self).__name__, {name: getattr(self, name) for name in self.__geometry_parameters__})
+                self.__polylines__ = cache.load(key)
+
+        if self.__polylines__ is None:
+            self.__polylines__ = []
+            # draw the pixel
+            self.__draw_geometry('coupling_capacitor', self.__draw_coupling_capacitor)
+            self.__draw_geometry('capacitor', self.__draw_capacitor)
+            self.__draw_geometry('absorber', self.__draw_absorber)
+            self.__draw_geometry('connections', self.__connect_components)
+            # join all the polygons of the pixel layer in a single polyline
+            with self.profiler.stage('merge', self) as record:
+                self.__add_polyline(self.__join_polygons(), self.pixel_layer_name)
+                record['vertices'] = len(self.__polylines__[-1][1])
+            # draw other layers above the pixel
+            with self.profiler.stage('areas', self):
+                self.__draw_center()
+                self.__draw_pixel_area()
+                self.__draw_absorber_area()
+            if cache_dir is not None:
+                with self.profiler.stage('cache_save', self):
+                    cache.save(key, self.__polylines__)
+
+        # in lazy mode the ezdxf drawing is created when it is first needed
+        if not lazy:
+            self.__materialize()
+
+    # the ezdxf drawing of the pixel
+    @property
+    def dxf(self):
+        if self.__dxf__ is None:
+            self.__materialize()
+        return self.__dxf__
+
+    # the modelspace of the ezdxf drawing of the pixel
+    @property
+    def msp(self):
+        return self.dxf.modelspace()
+
+    # creates the ezdxf drawing and draws the layers of the pixel
+    def __materialize(self):
+        with self.profiler.stage('setup', self):
+            # Create a new DXF R2018 drawing with the layers of the pixel
+            self.__dxf__ = new_drawing(((self.pixel_layer_name, self.pixel_layer_color),
+                                        (self.center_layer_name, self.center_layer_color),
+                                        (self.pixel_area_layer_name, self.pixel_area_layer_color),
+                                        (self.absorber_area_layer_name, self.absorber_area_layer_color),
+                                        (self.index_layer_name, self.index_layer_color)))
+
+        # ezdxf entities
+        with self.profiler.stage('entities', self, layout=self.msp):
+            for layer, points in self.__polylines__:
+                self.__draw_polyline(points, layer)
+            self.__draw_index()
+
+    # constructor parameters that define the geometry of the pixel layers
+    __geometry_parameters__ = ('vertical_size', 'line_width', 'coupling_capacitor_length', 'coupling_capacitor_width',
+                               'coupling_connector_width', 'coupling_capacitor_y_offset', 'capacitor_finger_number',
+                               'capacitor_finger_gap', 'capacitor_finger_width', 'hilbert_order', 'absorber_separation')
+
+    # draws some polygons of the pixel layer measuring them with the profiler
+    def __draw_geometry(self, stage, draw):
+        with self.profiler.stage(stage, self) as record:
+            n_vertices = self.__count_vertices() if self.profiler.enabled else 0
+            draw()
+            if self.profiler.enabled:
+                record['vertices'] = self.__count_vertices()-n_vertices
+
+    # counts the vertices of the pixel layer drawn so far
+    def __count_vertices(self):
+        polygons = self.__pixel_polygons__+self.__capacitor_polygons__
+        n_vertices = sum(int(np.sum(shapely.get_num_coordinates(polygon))) for polygon in polygons)
+        return n_vertices+(0 if self.__absorber_outline__ is None else len(self.__absorber_outline__))
+
+    # joins the polygons of the pixel layer to the absorber outline
+    def __join_polygons(self):
+        # the combs of the capacitor are spliced as they are to the ends of
+        # the absorber connectors and only the small coupling capacitor and
+        # its connector are merged, so that neither the absorber nor the
+        # capacitor enter a boolean union
+        polygons = [*self.__capacitor_polygons__, *shapely.get_parts(fc.merge_polygons(self.__pixel_polygons__))]
+        outline = self.__absorber_outline__
+        x_min, x_max = outline[:, 0].min(), outline[:, 0].max()
+        absorber_area = shapely.box(x_min+fc.JOIN_TOLERANCE, -fc.JOIN_TOLERANCE, x_max, self.vertical_size+fc.JOIN_TOLERANCE)
+        if not np.any(shapely.intersects(polygons, absorber_area)):
+            points = fc.join_rings(outline, [shapely.get_coordinates(polygon.exterior) for polygon in polygons])
+            if points is not None:
+                return points
+        # the polygons touch the absorber elsewhere, so they are merged with it
+        pixel_pl = fc.merge_polygons([*self.__pixel_polygons__, *self.__capacitor_polygons__, shapely.polygons(outline)])
+        return shapely.get_coordinates(pixel_pl.exterior)[:-1]
+
+    # adds a polyline to the pixel geometry
+    def __add_polyline(self, points, layer):
+        self.__polylines__.append((layer, np.asarray(points, dtype=float)))
+
+    # draws a lwpolyline from a list of points with the origin on the absorber center
     def __draw_polyline(self, points, layer):
-        self.msp.add_lwpolyline(points, close=True, dxfattribs={"layer": layer})
-
-    # adds a rectangle from opposite corners coordinates as a lwpolyline
-    def __draw_rectangle_corner_dimensions(self, corner0, x_size, y_size):
-        points =   ( corner0,
-                    (corner0[0]+x_size, corner0[1]),
-                    (corner0[0]+x_size, corner0[1]+y_size),
-                    (corner0[0], corner0[1]+y_size))
-        return Polygon(points)
-        #self.msp.add_lwpolyline(points, close=False, dxfattribs={"layer": layer})
-
-    # adds a rectangle from the center coordinates and dimensions as a lwpolyline
-    def __draw_rectangle_center_dimensions(self, center, x_size, y_size):
-        points =   ((center[0]-0.5*x_size, center[1]-0.5*y_size),
-                    (center[0]+0.5*x_size, center[1]-0.5*y_size),
-                    (center[0]+0.5*x_size, center[1]+0.5*y_size),
-                    (center[0]-0.5*x_size, center[1]+0.5*y_size))
-        return Polygon(points)
-        #self.msp.add_lwpolyline(points, close=False, dxfattribs={"layer": layer})
+        points = fc.translate_points(points, self.absorber_center[0], self.absorber_center[1])
+        fc.add_lwpolyline(self.msp, points, close=True, dxfattribs={"layer": layer})
 
     # draws the single digit coupling capacitor
     def __draw_coupling_capacitor(self):
         corner0 = (0, self.vertical_size+self.coupling_capacitor_y_offset)
         x_size = self.coupling_capacitor_length
         y_size = self.coupling_capacitor_width
-        self.__pixel_polygons__.append(self.__draw_rectangle_corner_dimensions(corner0, x_size, y_size))
+        self.__pixel_polygons__.append(fc.to_polygons(fc.draw_rectangles_corner_dimensions(corner0, x_size, y_size)))
 
     # draws the interdigital capacitor
     def __draw_capacitor(self):
         finger_number_int = int(self.capacitor_finger_number)
-
-        # draw fingers
-        for i in range(finger_number_int):
-            corner0 = (i*(self.capacitor_finger_width+self.capacitor_finger_gap), ((i+1)%2)*self.capacitor_finger_gap + self.line_width)
-            x_size = self.capacitor_finger_width
-            y_size = self.capacitor_finger_length
-            self.__pixel_polygons__.append(self.__draw_rectangle_corner_dimensions(corner0, x_size, y_size))
-
-        # pinky finger
+        finger_x = np.arange(finger_number_int, dtype=float)*(self.capacitor_finger_width+self.capacitor_finger_gap)
+        bus_length = finger_number_int*self.capacitor_finger_width + (finger_number_int-1)*self.capacitor_finger_gap
+
+        # upper comb: upper line with the even fingers
+        self.__capacitor_polygons__.append(fc.draw_comb(0.0, bus_length, self.vertical_size-self.line_width,
+                                                        self.line_width, finger_x[0::2], self.capacitor_finger_length,
+                                                        self.capacitor_finger_width, direction=-1))
+
+        # lower comb: lower line with the odd fingers and the pinky finger
+        lower_finger_x = finger_x[1::2]
+        lower_finger_length = np.full_like(lower_finger_x, self.capacitor_finger_length)
+        x0 = 0.0
         if self.capacitor_finger_number-finger_number_int != 0.0:
             pinky_length = self.capacitor_finger_length*(self.capacitor_finger_number-finger_number_int)
-            corner0 = (-self.capacitor_finger_gap-self.capacitor_finger_width, self.line_width)
-            x_size = self.capacitor_finger_width
-            y_size = pinky_length
-            self.__pixel_polygons__.append(self.__draw_rectangle_corner_dimensions(corner0, x_size, y_size))
-
-        # draw the two horizontal lines
-        # upper line
-        corner0 = (0.0, self.vertical_size-self.line_width)
-        x_size = finger_number_int*self.capacitor_finger_width + (finger_number_int-1)*self.capacitor_finger_gap
-        y_size = self.line_width
-        self.__pixel_polygons__.append(self.__draw_rectangle_corner_dimensions(corner0, x_size, y_size))
-        # lower line
-        if self.capacitor_finger_number-finger_number_int != 0.0:
-            corner0 = (-self.capacitor_finger_gap-self.capacitor_finger_width, 0.0)
-            x_size = (finger_number_int+1)*self.capacitor_finger_width + finger_number_int*self.capacitor_finger_gap
-            y_size = self.line_width
-            self.__pixel_polygons__.append(self.__draw_rectangle_corner_dimensions(corner0, x_size, y_size))
-        else:
-            corner0 = (0.0, 0.0)
-            self.__pixel_polygons__.append(self.__draw_rectangle_corner_dimensions(corner0, x_size, y_size))
+            x0 = -self.capacitor_finger_gap-self.capacitor_finger_width
+            lower_finger_x = np.append(lower_finger_x, x0)
+            lower_finger_length = np.append(lower_finger_length, pinky_length)
+        self.__capacitor_polygons__.append(fc.draw_comb(x0, bus_length, self.line_width,
+                                                        self.line_width, lower_finger_x, lower_finger_length,
+                                                        self.capacitor_finger_width, direction=1))
 
     # draws the hilbert shaped absorber
     def __draw_absorber(self):
-        axiom = "X"
-        X_rule = "-YF+XFX+FY-"
-        Y_rule = "+XF-YFY-FX+"
-        for i in range(self.hilbert_order):
-            new_axiom = ""
-            for word in axiom:
-                if word == "X":
-                    new_axiom += X_rule
-                elif word == "Y":
-                    new_axiom += Y_rule
-                else:
-                    new_axiom += word
-            axiom = new_axiom
-        axiom = axiom.replace("X", "")
-        axiom = axiom.replace("Y", "")
-        axiom = axiom.replace("+-", "")
-        axiom = axiom.replace("-+", "")
-
-        points = []
-
-        # add an initial horizontal offset to the hilbert pattern
-        points.append([0.5*self.line_width, 0.0])
-        L_el = (self.vertical_size-self.line_width)/(2.0**self.hilbert_order-1)
-        step = [0, L_el]
-        for word in axiom:
-            if word == "-":     # turn right
-                new_step = [step[1], -step[0]]
-                step = new_step
-            elif word == "+":   # turn left
-                new_step = [-step[1], step[0]]
-                step = new_step
-            elif word == "F":
-                points.append(step)
-        # add a final horizontal offset to the hilbert pattern
-        points.append([-0.5*self.line_width, 0.0])
-
-        # draw the midline
+        # the absorber outline is shared by all the pixels with the same
+        # vertical_size, line_width and hilbert_order
         x0 = self.absorber_separation+int(self.capacitor_finger_number)*self.capacitor_finger_width+int(self.capacitor_finger_number-1)*self.capacitor_finger_gap
-        y0 = 0.5*self.line_width
-        starting_point = [x0, y0]
-
-        for point in points:
-            center = (0.5*(2*starting_point[0]+point[0]), 0.5*(2*starting_point[1]+point[1]))
-            x_size = np.abs(point[0])+self.line_width
-            y_size = np.abs(point[1])+self.line_width
-            self.__pixel_polygons__.append(self.__draw_rectangle_center_dimensions(center, x_size, y_size))
-            starting_point = [starting_point[0]+point[0], starting_point[1]+point[1]]
+        absorber = fc.draw_absorber(self.vertical_size, self.line_width, self.hilbert_order)
+        self.__absorber_outline__ = fc.translate_points(shapely.get_coordinates(absorber.exterior)[:-1], x0, 0.0)
 
     # draws connection lines between components
     def __connect_components(self):
         # coupling capacitor connector
         corner0 = (0.0, self.vertical_size)
-        x_size = self.coupling_connector_width
-        y_size = self.coupling_capacitor_y_offset
-        self.__pixel_polygons__.append(self.__draw_rectangle_corner_dimensions(corner0, x_size, y_size))
-
-        # absorber connectors
+        self.__pixel_polygons__.append(fc.to_polygons(fc.draw_rectangles_corner_dimensions(corner0, self.coupling_connector_width,
+                                                                                          self.coupling_capacitor_y_offset)))
+        # the absorber connectors lie on the square ends of the absorber path,
+        # so the ends are stretched up to the capacitor
         x0 = int(self.capacitor_finger_number)*self.capacitor_finger_width+int(self.capacitor_finger_number-1)*self.capacitor_finger_gap
-        corner0 = (x0, 0.0)
-        x_size = self.absorber_separation
-        y_size = self.line_width
-        self.__pixel_polygons__.append(self.__draw_rectangle_corner_dimensions(corner0, x_size, y_size))
-        corner0 = (x0, self.vertical_size-self.line_width)
-        self.__pixel_polygons__.append(self.__draw_rectangle_corner_dimensions(corner0, x_size, y_size))
+        outline = self.__absorber_outline__
+        ends = outline[:, 0] < outline[:, 0].min()+fc.JOIN_TOLERANCE
+        outline[ends, 0] = min(outline[ends, 0].min(), x0)
 
     # draws a cross over the absorber to find its center
     def __draw_center(self):
         # draw the diagonals to find the center
         x0 = self.absorber_separation+int(self.capacitor_finger_number)*self.capacitor_finger_width+int(self.capacitor_finger_number-1)*self.capacitor_finger_gap
         points = ((x0, 0.0), (x0+self.vertical_size, self.vertical_size))
-        self.__draw_polyline(points, self.center_layer_name)
+        self.__add_polyline(points, self.center_layer_name)
         points = ((x0, self.vertical_size), (x0+self.vertical_size, 0.0))
-        self.__draw_polyline(points, self.center_layer_name)
+        self.__add_polyline(points, self.center_layer_name)
 
     # draws a box over the whole pixel
     def __draw_pixel_area(self):
@@ -287,22 +339,37 @@ class HilbertIShape():
             x_size = cor1[0]-cor0[0]
 
         y_size = cor1[1]-cor0[1]
-        self.__draw_polyline(self.__draw_rectangle_corner_dimensions(cor0, x_size, y_size).exterior.coords, self.pixel_area_layer_name)
+        self.__add_polyline(fc.draw_rectangles_corner_dimensions(cor0, x_size, y_size)[0], self.pixel_area_layer_name)
 
     # draws a box over the absorber
     def __draw_absorber_area(self):
         corner0 = (self.absorber_separation+int(self.capacitor_finger_number)*self.capacitor_finger_width+int(self.capacitor_finger_number-1)*self.capacitor_finger_gap, 0.0)
         x_size = self.vertical_size
         y_size = self.vertical_size
-        self.__draw_polyline(self.__draw_rectangle_corner_dimensions(corner0, x_size, y_size).exterior.coords, self.absorber_area_layer_name)
+        self.__add_polyline(fc.draw_rectangles_corner_dimensions(corner0, x_size, y_size)[0], self.absorber_area_layer_name)
 
     # draws the textual index on the absorber
     def __draw_index(self):
-        position = (self.absorber_separation+int(self.capacitor_finger_number)*self.capacitor_finger_width+int(self.capacitor_finger_number-1)*self.capacitor_finger_gap, 0.0)
-        height = 0.35*self.vertical_size
-        text = str(self.index)
+        position, height, text = self.__index_text()
         self.msp.add_text(text, dxfattribs={'height': height, 'layer': self.index_layer_name}).set_pos(position, align='LEFT')
 
+    # returns the position, height and text of the index label
+    def __index_text(self):
+        position = (self.absorber_separation+int(self.capacitor_finger_number)*self.capacitor_finger_width+int(self.capacitor_finger_number-1)*self.capacitor_finger_gap, 0.0)
+        position = tuple(fc.translate_points(position, self.absorber_center[0], self.absorber_center[1]))
+        return position, 0.35*self.vertical_size, str(self.index)
+
+    # returns the geometry of the layers as Preview.layout_geometry does,
+    # without the ezdxf drawing
+    def __preview_geometry(self):
+        geometry = {}
+        for layer, points in self.__polylines__:
+            points = fc.translate_points(points, self.absorber_center[0], self.absorber_center[1])
+            geometry.setdefault(layer, {'polygons': [], 'lines': [], 'texts': []})['polygons'].append(points)
+        (x, y), height, text = self.__index_text()
+        geometry[self.index_layer_name] = {'polygons': [], 'lines': [], 'texts': [(x, y, height, text, 0.0, 0)]}
+        return geometry
+
     # prints on screen all the parameters
     def print_info(self):
         '''
@@ -310,6 +377,72 @@ class HilbertIShape():
 		'''
         print(self.info_string)
 
+    # returns the polylines of a layer
+    def layer_points(self, layer):
+        '''
+        This function returns the polylines of a layer of the pixel as arrays
+        of points, with the absorber centered to the origin as in the dxf
+        drawing. The ezdxf drawing is not needed.
+
+        Parameters
+        ----------
+        layer : string
+            The name of the layer, ex. 'PIXEL'.
+
+        Returns
+        -------
+        list of numpy.ndarray
+            The (n, 2) arrays of the points of the polylines.
+
+        '''
+        return [fc.translate_points(points, self.absorber_center[0], self.absorber_center[1])
+                for name, points in self.__polylines__ if name == layer]
+
+    # computes the bounding box of the pixel
+    def bounding_box(self):
+        '''
+        This function computes the bounding box of the metal of the pixel
+        (PIXEL layer), with the absorber centered to the origin as in the dxf
+        drawing.
+
+        Returns
+        -------
+        tuple of floats
+            The (x_min, y_min, x_max, y_max) coordinates in microns.
+
+        '''
+        points = np.concatenate(self.layer_points(self.pixel_layer_name))
+        return tuple(float(value) for value in (*points.min(axis=0), *points.max(axis=0)))
+
+    # computes the area of the metal of the pixel
+    def metal_area(self):
+        '''
+        This function computes the area of the metal of the pixel (PIXEL
+        layer).
+
+        Returns
+        -------
+        float
+            The area in square microns.
+
+        '''
+        return float(np.sum(shapely.area(shapely.polygons(self.layer_points(self.pixel_layer_name)))))
+
+    # computes the length of the inductor
+    def line_length(self):
+        '''
+        This function computes the length of the midline of the inductor of
+        the pixel, i.e. the hilbert shaped absorber and its two connectors
+        (see Resonator.inductor_length).
+
+        Returns
+        -------
+        float
+            The length in microns.
+
+        '''
+        return float(inductor_length(self.vertical_size, self.line_width, self.hilbert_order, self.absorber_separation))
+
     # saves a dxf file of the pixel
     def save_dxf(self, filename):
         '''
@@ -331,48 +464,64 @@ class HilbertIShape():
         if not os.path.exists(filename.parent):
             os.makedirs(filename.parent)
 
-        # draw pixel
-        self.__draw_coupling_capacitor()
-        self.__draw_capacitor()
-        self.__draw_absorber()
-        self.__connect_components()
-        # merge all the polygons of the pixel layer and draw a single polyline
-        pixel_pl = unary_union(self.__pixel_polygons__)
-        self.__draw_polyline(pixel_pl.exterior.coords, self.pixel_layer_name)
-        # draw other layers above the pixel
-        self.__draw_center()
-        self.__draw_pixel_area()
-        self.__draw_absorber_area()
-        self.__draw_index()
-
-        # center position of the absorber
-        center=(-0.5*self.vertical_size-
-                self.absorber_separation-
-                int(self.capacitor_finger_number)*self.capacitor_finger_width-
-                int(self.capacitor_finger_number-1)*self.capacitor_finger_gap,
-                -0.5*self.vertical_size)
-
-        # origin on the absorber center
-        for entity in self.msp:
-            entity.transform(ezdxf.math.Matrix44.translate(center[0], center[1], 0.0))
-
-        self.dxf.saveas(filename)
+        with self.profiler.stage('save_dxf', self):
+            self.dxf.saveas(filename)
 
     # saves the figure of a pixel
-    def saveFig(self, filename, dpi=150):
+    def saveFig(self, filename, dpi=150, show=True):
         '''
         Save a figure of the drawing
     	Parameters:
             filename: string, output path and filename of the figure
             dpi: int (optional), dpi of the figure, default value: 150
+            show: bool (optional), if True the figure is also shown, default
+                value: True
         '''
         # check if the output directory exists
         filename = Path(filename)
         if not os.path.exists(filename.parent):
             os.makedirs(filename.parent)
 
-        fig = plt.figure()
-        ax = fig.add_axes([0, 0, 1, 1])
-        backend = MatplotlibBackend(ax)
-        Frontend(RenderContext(self.dxf), backend).draw_layout(self.msp)
-        fig.savefig(filename, dpi=dpi)
+        with self.profiler.stage('saveFig', self):
+            fig = plt.figure()
+            ax = fig.add_axes([0, 0, 1, 1])
+            backend = MatplotlibBackend(ax)
+            Frontend(RenderContext(self.dxf), backend).draw_layout(self.msp)
+            fig.savefig(filename, dpi=dpi)
+        # the figure is closed to release its memory
+        if show:
+            plt.show()
+        plt.close(fig)
+
+    # saves a fast preview figure of the pixel
+    def savePreview(self, filename, dpi=250, layers=None, fill=False):
+        '''
+        This function saves a fast preview figure of the pixel, drawn
+        directly from the polyline coordinates without the ezdxf drawing
+        frontend (see Preview.save_preview). The ezdxf drawing is not
+        needed, so in lazy mode it is not created.
+
+        Parameters
+        ----------
+        filename : string
+            Output path and filename of the figure.
+        dpi : int, optional
+            Dpi of the figure. The default is 250.
+        layers : list of strings, optional
+            The layers to be drawn, ex. ['PIXEL', 'INDEX']. The default is
+            None, i.e. all the layers.
+        fill : bool, optional
+            If True the closed polylines are filled. The default is False.
+
+        Returns
+        -------
+        None.
+
+        '''
+        with self.profiler.stage('savePreview', self):
+            colors = {self.pixel_layer_name: self.pixel_layer_color,
+                      self.center_layer_name: self.center_layer_color,
+                      self.pixel_area_layer_name: self.pixel_area_layer_color,
+                      self.absorber_area_layer_name: self.absorber_area_layer_color,
+                      self.index_layer_name: self.index_layer_color}
+            save_preview(self.__preview_geometry(), filename, dpi=dpi, layers=layers, lod=False, fill=fill, colors=colors)
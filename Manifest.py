@@ -0,0 +1,139 @@
+# KID drawer (DXF file generator) - Federico Cacciotti (c)2022
+
+# import packages
+import json
+import hashlib
+import os
+import numpy as np
+from pathlib import Path
+
+class Manifest():
+    def __init__(self, filename):
+        '''
+        This class is a build manifest, used for incremental rebuilds. It
+        stores a content hash of the inputs of each output file (pixel
+        parameters, placement, ...) in a json file. An output is rebuilt only
+        if its hash changed or the file is missing, otherwise the existing
+        file is reused.
+
+        Parameters
+        ----------
+        filename : string
+            Path to the json manifest file. It is created if it does not
+            exist.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.filename = Path(filename)
+        self.entries = {}
+        if self.filename.exists():
+            try:
+                with open(self.filename, 'r') as file:
+                    self.entries = json.load(file)
+            except ValueError:
+                print("Warning. The manifest '"+str(self.filename)+"' is not valid, everything will be rebuilt.")
+
+    # checks if an output file has to be rebuilt
+    def changed(self, key, digest, filename=None):
+        '''
+        This function checks if an output has to be rebuilt.
+
+        Parameters
+        ----------
+        key : string
+            The name of the output in the manifest, ex. 'pixel_1.dxf'.
+        digest : string
+            The hash of the current inputs of the output.
+        filename : string, optional
+            The path to the output file, if given the output is considered
+            changed when the file does not exist. The default is None.
+
+        Returns
+        -------
+        bool
+            True if the output has to be rebuilt.
+
+        '''
+        if filename is not None and not os.path.exists(filename):
+            return True
+        return self.entries.get(str(key)) != digest
+
+    # records the hash of an output
+    def update(self, key, digest):
+        '''
+        This function records the hash of the inputs of a built output.
+
+        Parameters
+        ----------
+        key : string
+            The name of the output in the manifest, ex. 'pixel_1.dxf'.
+        digest : string
+            The hash of the inputs of the output.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.entries[str(key)] = digest
+
+    # saves the manifest file
+    def save(self):
+        '''
+        This function saves the manifest file. The file is replaced
+        atomically, so that an interrupted build never leaves a corrupted
+        manifest.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if not self.filename.parent.exists():
+            os.makedirs(self.filename.parent)
+        temporary = self.filename.with_name(self.filename.name+'.tmp')
+        with open(temporary, 'w') as file:
+            json.dump(self.entries, file, indent=1, sort_keys=True)
+        os.replace(temporary, self.filename)
+
+
+# computes a content hash of some inputs
+def content_hash(*items):
+    '''
+    This function computes a content hash of some inputs. Dictionaries,
+    lists, numbers and strings are hashed by value, numpy arrays by their
+    data, bytes as they are.
+
+    Parameters
+    ----------
+    *items : any
+        The inputs to be hashed.
+
+    Returns
+    -------
+    string
+        The hexadecimal sha1 digest.
+
+    '''
+    digest = hashlib.sha1()
+    for item in items:
+        if isinstance(item, bytes):
+            digest.update(item)
+        elif isinstance(item, np.ndarray):
+            digest.update(str((item.dtype.str, item.shape)).encode())
+            digest.update(np.ascontiguousarray(item).tobytes())
+        else:
+            digest.update(json.dumps(item, sort_keys=True, default=_json_value).encode())
+    return digest.hexdigest()
+
+
+# converts numpy values and other objects to json values
+def _json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return repr(value)
@@ -1,11 +1,17 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle, Circle
-from matplotlib.textpath import TextPath
+from functools import lru_cache
+from matplotlib.patches import Circle
+from matplotlib.path import Path
+from matplotlib.textpath import TextPath, text_to_path
 from matplotlib.patches import PathPatch
+from matplotlib.collections import PolyCollection
 from matplotlib.font_manager import FontProperties
 
-def circularTriangleLattice(radius, pitch, element_dimension, rotation=0, central_pixel_magic_number=0):
+# default maximum number of candidate nodes of the blocks of the lattices
+LATTICE_CHUNK_SIZE = 65536
+
+def circularTriangleLattice(radius, pitch, element_dimension, rotation=0, central_pixel_magic_number=0, plot=False):
     '''
     This function generates the coordinates of a triangular lattice inside a 
     circle of a given radius
@@ -25,81 +31,31 @@ def circularTriangleLattice(radius, pitch, element_dimension, rotation=0, centra
         will be rotated by 180 degrees, if 0 no rotation will be applied.
     central_pixel_magic_number : int, optional
         1 or 0. Default is 0.
+    plot : bool, optional
+        If True the lattice is plotted, see plotLattice. Default is False.
 
     Returns
     -------
     n : int
         Number of nodes found.
-    x : list of floats
+    x : numpy.ndarray of floats
         The x coordinates of the lattice nodes in microns.
-    y : list of floats
+    y : numpy.ndarray of floats
         The y coordinates of the lattice nodes in microns.
-    r : list of floats
+    r : numpy.ndarray of floats
         The rotations to be applied at each node in degrees.
 
     '''
-    n = 0
-    x = []
-    y = []
-    r = []
-    
-    x_step = pitch
-    y_step = pitch * np.sqrt(3)*0.5
-    
-    # both the following numbers must be odd (in order to find the central pixel)
-    maximum_number_diameter_x = int(radius*2.0 // x_step)
-    if maximum_number_diameter_x % 2 == 0:
-        maximum_number_diameter_x += 1
-    
-    maximum_number_diameter_y = int(radius*2.0 // y_step)
-    if maximum_number_diameter_y % 2 == 0:
-        maximum_number_diameter_y += 1
-        
-    x_min = -(maximum_number_diameter_x-1)*0.5*x_step
-    y_min = -(maximum_number_diameter_y-1)*0.5*y_step
+    n, x, y, r = _joinChunks(circularTriangleLatticeChunks(radius, pitch, element_dimension, rotation,
+                                                           central_pixel_magic_number, chunk_size=None))
+
+    if plot:
+        plotLattice(x, y, element_dimension, radius=radius)
 
-    for i,y_i in enumerate(np.linspace(y_min, -y_min, num=maximum_number_diameter_y)):
-        for j,x_j in enumerate(np.linspace(x_min, -x_min, num=maximum_number_diameter_x)):
-            if (y_i**2. + (x_j+((i+central_pixel_magic_number)%2)*x_step*0.5)**2.0) <= (radius-element_dimension/np.sqrt(2))**2.0:
-                x.append(x_j+((i+central_pixel_magic_number)%2)*x_step*0.5)
-                y.append(y_i)
-                
-                # check rotation parameter
-                if rotation == 1:
-                    r.append(180*(i%2))
-                elif rotation == -1:
-                    r.append(180*((i+1)%2))
-                else:
-                    r.append(0)
-                # increase the number of nodes found
-                n += 1
-                
-    fig = plt.figure()
-    plt.xlim([-1.2*radius, 1.2*radius])
-    plt.ylim([-1.2*radius, 1.2*radius])
-    ax0 = plt.gca()
-    ax0.set_xlabel('x position [microns]')
-    ax0.set_ylabel('y position [microns]')
-    ax0.set_aspect('equal')
-    fp = FontProperties(family='Helvetica', style='normal', weight='light')
-    # draw squares
-    for i, (xi, yi, ri) in enumerate(zip(x, y, r)):
-        rectangle = Rectangle((xi-element_dimension*0.5, yi-element_dimension*0.5), element_dimension, element_dimension,
-                              edgecolor='black', fill=False, linewidth=0.5)
-        ax0.add_patch(rectangle)
-        
-        tp = TextPath((xi-element_dimension*0.5, yi-element_dimension*0.25), "{:d}".format(i), size=element_dimension*0.5, prop=fp)
-        ax0.add_patch(PathPatch(tp, color="black"))
-    
-    # draw circle of radius = radius
-    circle = Circle((0.0, 0.0), radius=radius, edgecolor='red', fill=False, linewidth=0.5)
-    ax0.add_patch(circle)
-    plt.show()
-    
     return n, x, y, r
 
 
-def circularSquareLattice(radius, pitch, element_dimension, rotation=0):
+def circularSquareLattice(radius, pitch, element_dimension, rotation=0, plot=False):
     '''
     This function generates the coordinates of a square lattice inside a 
     circle of a given radius
@@ -117,71 +73,31 @@ def circularSquareLattice(radius, pitch, element_dimension, rotation=0):
         This parameter can be 1, 0 or -1. If 1 all the even rows (starting from
         the lower one) will be rotated by 180 degrees, if -1 all the odd rows 
         will be rotated by 180 degrees, if 0 no rotation will be applied.
+    plot : bool, optional
+        If True the lattice is plotted, see plotLattice. Default is False.
 
     Returns
     -------
     n : int
         Number of nodes found.
-    x : list of floats
+    x : numpy.ndarray of floats
         The x coordinates of the lattice nodes in microns.
-    y : list of floats
+    y : numpy.ndarray of floats
         The y coordinates of the lattice nodes in microns.
-    r : list of floats
+    r : numpy.ndarray of floats
         The rotations to be applied at each node in degrees.
 
     '''
-    n = 0
-    x = []
-    y = []
-    r = []
-    
-    maximum_number = int(radius*2.0 // pitch)
-    x_min = -(radius // pitch)*pitch
-    y_min = -(radius // pitch)*pitch
+    n, x, y, r = _joinChunks(circularSquareLatticeChunks(radius, pitch, element_dimension, rotation, chunk_size=None))
+
+    if plot:
+        plotLattice(x, y, element_dimension, radius=radius)
 
-    for i,y_i in enumerate(np.linspace(y_min, -y_min, num=maximum_number)):
-        for j,x_j in enumerate(np.linspace(x_min, -x_min, num=maximum_number)):
-            if (y_i**2. + (x_j)**2.) <= (radius-element_dimension/np.sqrt(2))**2.:
-                x.append(x_j)
-                y.append(y_i)
-                
-                # check rotation parameter
-                if rotation == 1:
-                    r.append(180*(i%2))
-                elif rotation == -1:
-                    r.append(180*((i+1)%2))
-                else:
-                    r.append(0)
-                # increase the number of nodes found
-                n += 1
-
-    fig = plt.figure()
-    plt.xlim([-1.2*radius, 1.2*radius])
-    plt.ylim([-1.2*radius, 1.2*radius])
-    ax0 = plt.gca()
-    ax0.set_xlabel('x position [microns]')
-    ax0.set_ylabel('y position [microns]')
-    ax0.set_aspect('equal')
-    fp = FontProperties(family='Helvetica', style='normal', weight='light')
-    # draw squares
-    for i, (xi, yi, ri) in enumerate(zip(x, y, r)):
-        rectangle = Rectangle((xi-element_dimension*0.5, yi-element_dimension*0.5), element_dimension, element_dimension,
-                              edgecolor='black', fill=False, linewidth=0.5)
-        ax0.add_patch(rectangle)
-        
-        tp = TextPath((xi-element_dimension*0.5, yi-element_dimension*0.25), "{:d}".format(i), size=element_dimension*0.5, prop=fp)
-        ax0.add_patch(PathPatch(tp, color="black"))
-    
-    # draw circle of radius = radius
-    circle = Circle((0.0, 0.0), radius=radius, edgecolor='red', fill=False, linewidth=0.5)
-    ax0.add_patch(circle)
-    plt.show()
-                
     return n, x, y, r
 
 
 
-def squareTriangleLattice(pitch, nx_elements, ny_elements, element_dimension, rotation=0, central_pixel_magic_number=0):
+def squareTriangleLattice(pitch, nx_elements, ny_elements, element_dimension, rotation=0, central_pixel_magic_number=0, plot=False):
     '''
     This function generates the coordinates of a triangular lattice inside a 
     square of a given side
@@ -203,61 +119,309 @@ def squareTriangleLattice(pitch, nx_elements, ny_elements, element_dimension, ro
         will be rotated by 180 degrees, if 0 no rotation will be applied.
     central_pixel_magic_number : int, optional
         1 or 0. Default is 0.
+    plot : bool, optional
+        If True the lattice is plotted, see plotLattice. Default is False.
 
     Returns
     -------
     n : int
         Number of nodes found.
-    x : list of floats
+    x : numpy.ndarray of floats
         The x coordinates of the lattice nodes in microns.
-    y : list of floats
+    y : numpy.ndarray of floats
         The y coordinates of the lattice nodes in microns.
-    r : list of floats
+    r : numpy.ndarray of floats
         The rotations to be applied at each node in degrees.
 
     '''
-    n = 0
-    x = []
-    y = []
-    r = []
-    
     x_step = pitch
     y_step = pitch * np.sqrt(3)*0.5
+
+    n, x, y, r = _joinChunks(squareTriangleLatticeChunks(pitch, nx_elements, ny_elements, element_dimension, rotation,
+                                                         central_pixel_magic_number, chunk_size=None))
+
+    if plot:
+        plotLattice(x, y, element_dimension, xlim=[-1000, nx_elements*x_step+1000],
+                    ylim=[-1000, ny_elements*y_step+1000], dpi=300)
+
+    return n, x, y, r
+
+
+def circularTriangleLatticeChunks(radius, pitch, element_dimension, rotation=0, central_pixel_magic_number=0, chunk_size=LATTICE_CHUNK_SIZE):
+    '''
+    This function generates the nodes of circularTriangleLattice in blocks,
+    in the same order. Only one block at a time is kept in memory, so that
+    lattices with millions of nodes can be generated with a constant memory.
+    The blocks can be given to Array (nodes parameter).
+
+    Parameters
+    ----------
+    radius : float
+        The radius of the circle in microns.
+    pitch : float
+        The unit cell length of the lattice in microns.
+    element_dimension : float
+        The dimension of a node of the lattice, it coincides with the absorber 
+        side in microns.
+    rotation : int, optional
+        1, 0 or -1, see circularTriangleLattice. Default is 0.
+    central_pixel_magic_number : int, optional
+        1 or 0. Default is 0.
+    chunk_size : int, optional
+        Maximum number of candidate nodes checked for each block, i.e. the
+        maximum number of nodes of a block. If None the whole lattice is a
+        single block. Default is LATTICE_CHUNK_SIZE.
+
+    Yields
+    ------
+    x : numpy.ndarray of floats
+        The x coordinates of the nodes of the block in microns.
+    y : numpy.ndarray of floats
+        The y coordinates of the nodes of the block in microns.
+    r : numpy.ndarray of floats
+        The rotations to be applied at the nodes of the block in degrees.
+
+    '''
+    x_step = pitch
+    y_step = pitch * np.sqrt(3)*0.5
+    
+    # both the following numbers must be odd (in order to find the central pixel)
+    maximum_number_diameter_x = int(radius*2.0 // x_step)
+    if maximum_number_diameter_x % 2 == 0:
+        maximum_number_diameter_x += 1
     
-    for y_i in range(ny_elements):
-        for x_j in range(nx_elements-(y_i)%2):
-
-            x.append(x_j*x_step+((y_i+central_pixel_magic_number)%2)*x_step*0.5)
-            y.append(y_i*y_step)
-                
-            # check rotation parameter
-            if rotation == 1:
-                r.append(180*(y_i%2))
-            elif rotation == -1:
-                r.append(180*((y_i+1)%2))
-            else:
-                r.append(0)
-            # increase the number of nodes found
-            n += 1
-                
-    fig = plt.figure(dpi=300)
+    maximum_number_diameter_y = int(radius*2.0 // y_step)
+    if maximum_number_diameter_y % 2 == 0:
+        maximum_number_diameter_y += 1
+        
+    x_min = -(maximum_number_diameter_x-1)*0.5*x_step
+    y_min = -(maximum_number_diameter_y-1)*0.5*y_step
+
+    x_values = np.linspace(x_min, -x_min, num=maximum_number_diameter_x)
+    y_values = np.linspace(y_min, -y_min, num=maximum_number_diameter_y)
+    # the odd rows are shifted by half a step
+    x_offsets = ((np.arange(maximum_number_diameter_y)+central_pixel_magic_number)%2)*x_step*0.5
+
+    def nodes(rows, columns):
+        x = x_values[columns] + x_offsets[rows]
+        y = y_values[rows]
+        mask = (y**2. + x**2.0) <= (radius-element_dimension/np.sqrt(2))**2.0
+        return x[mask], y[mask], rows[mask]
+
+    yield from _latticeChunks(maximum_number_diameter_y, maximum_number_diameter_x, nodes, rotation, chunk_size)
+
+
+def circularSquareLatticeChunks(radius, pitch, element_dimension, rotation=0, chunk_size=LATTICE_CHUNK_SIZE):
+    '''
+    This function generates the nodes of circularSquareLattice in blocks, in
+    the same order, see circularTriangleLatticeChunks.
+
+    Parameters
+    ----------
+    radius : float
+        The radius of the circle in microns.
+    pitch : float
+        The unit cell length of the lattice in microns.
+    element_dimension : float
+        The dimension of a node of the lattice, it coincides with the absorber 
+        side in microns.
+    rotation : int, optional
+        1, 0 or -1, see circularSquareLattice. Default is 0.
+    chunk_size : int, optional
+        Maximum number of candidate nodes checked for each block, i.e. the
+        maximum number of nodes of a block. If None the whole lattice is a
+        single block. Default is LATTICE_CHUNK_SIZE.
+
+    Yields
+    ------
+    x : numpy.ndarray of floats
+        The x coordinates of the nodes of the block in microns.
+    y : numpy.ndarray of floats
+        The y coordinates of the nodes of the block in microns.
+    r : numpy.ndarray of floats
+        The rotations to be applied at the nodes of the block in degrees.
+
+    '''
+    maximum_number = int(radius*2.0 // pitch)
+    x_min = -(radius // pitch)*pitch
+    y_min = -(radius // pitch)*pitch
+
+    x_values = np.linspace(x_min, -x_min, num=maximum_number)
+    y_values = np.linspace(y_min, -y_min, num=maximum_number)
+
+    def nodes(rows, columns):
+        x = x_values[columns]
+        y = y_values[rows]
+        mask = (y**2. + (x)**2.) <= (radius-element_dimension/np.sqrt(2))**2.
+        return x[mask], y[mask], rows[mask]
+
+    yield from _latticeChunks(maximum_number, maximum_number, nodes, rotation, chunk_size)
+
+
+def squareTriangleLatticeChunks(pitch, nx_elements, ny_elements, element_dimension, rotation=0, central_pixel_magic_number=0, chunk_size=LATTICE_CHUNK_SIZE):
+    '''
+    This function generates the nodes of squareTriangleLattice in blocks, in
+    the same order, see circularTriangleLatticeChunks.
+
+    Parameters
+    ----------
+    pitch : float
+        The unit cell length of the lattice in microns.
+    nx_elements : float
+        Number of elements along the x axis.
+    ny_elements : float
+        Number of elements along the y axis.
+    element_dimension : float
+        The dimension of a node of the lattice, it coincides with the absorber 
+        side in microns.
+    rotation : int, optional
+        1, 0 or -1, see squareTriangleLattice. Default is 0.
+    central_pixel_magic_number : int, optional
+        1 or 0. Default is 0.
+    chunk_size : int, optional
+        Maximum number of candidate nodes checked for each block, i.e. the
+        maximum number of nodes of a block. If None the whole lattice is a
+        single block. Default is LATTICE_CHUNK_SIZE.
+
+    Yields
+    ------
+    x : numpy.ndarray of floats
+        The x coordinates of the nodes of the block in microns.
+    y : numpy.ndarray of floats
+        The y coordinates of the nodes of the block in microns.
+    r : numpy.ndarray of floats
+        The rotations to be applied at the nodes of the block in degrees.
+
+    '''
+    x_step = pitch
+    y_step = pitch * np.sqrt(3)*0.5
+
+    def nodes(rows, columns):
+        # the odd rows have one node less
+        mask = columns < nx_elements-rows%2
+        rows = rows[mask]
+        x = columns[mask]*x_step+((rows+central_pixel_magic_number)%2)*x_step*0.5
+        y = rows*y_step
+        return x, y, rows
+
+    yield from _latticeChunks(ny_elements, nx_elements, nodes, rotation, chunk_size)
+
+
+def plotLattice(x, y, element_dimension, radius=None, xlim=None, ylim=None, dpi=None):
+    '''
+    This function plots the nodes of a lattice as squares labeled with their
+    index and shows the figure. The squares are drawn as a single collection
+    and the labels as a single path, so that lattices with thousands of
+    nodes are plotted in a few seconds.
+
+    Parameters
+    ----------
+    x : list or numpy.ndarray of floats
+        The x coordinates of the lattice nodes in microns.
+    y : list or numpy.ndarray of floats
+        The y coordinates of the lattice nodes in microns.
+    element_dimension : float
+        The dimension of a node of the lattice, it coincides with the absorber 
+        side in microns.
+    radius : float, optional
+        If given, the circle of this radius is drawn and the axes limits are
+        set to 1.2 times the radius. Default is None.
+    xlim : list of floats, optional
+        The x axis limits in microns. Default is None.
+    ylim : list of floats, optional
+        The y axis limits in microns. Default is None.
+    dpi : int, optional
+        Dpi of the figure. Default is None, i.e. the Matplotlib default.
+
+    Returns
+    -------
+    fig : matplotlib.figure.Figure
+        The figure.
+
+    '''
+    fig = plt.figure(dpi=dpi)
     ax0 = fig.gca()
+    if radius is not None:
+        xlim = [-1.2*radius, 1.2*radius] if xlim is None else xlim
+        ylim = [-1.2*radius, 1.2*radius] if ylim is None else ylim
     ax0.set_xlabel('x position [microns]')
     ax0.set_ylabel('y position [microns]')
     ax0.set_aspect('equal')
-    fp = FontProperties(family='Helvetica', style='normal', weight='light')
-    # draw squares
-    for i, (xi, yi, ri) in enumerate(zip(x, y, r)):
-        rectangle = Rectangle((xi-element_dimension*0.5, yi-element_dimension*0.5), element_dimension, element_dimension,
-                              edgecolor='black', fill=False, linewidth=0.5)
-        ax0.add_patch(rectangle)
-        
-        tp = TextPath((xi-element_dimension*0.5, yi-element_dimension*0.25), "{:d}".format(i), size=element_dimension*0.5, prop=fp)
-        ax0.add_patch(PathPatch(tp, color="black"))
-    
-    
-    ax0.set_xlim([-1000, nx_elements*x_step+1000])
-    ax0.set_ylim([-1000, ny_elements*y_step+1000])
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # draw squares, as a single collection
+    corners = np.array([[-0.5, -0.5], [0.5, -0.5], [0.5, 0.5], [-0.5, 0.5]])*element_dimension
+    squares = np.stack((x, y), axis=-1)[:, np.newaxis, :] + corners
+    ax0.add_collection(PolyCollection(squares, closed=True, edgecolors='black', facecolors='none', linewidths=0.5))
+
+    # draw the indices, composed from the cached glyphs of the digits
+    glyphs, advances = _digitGlyphs()
+    size = element_dimension*0.5
+    vertices = []
+    codes = []
+    for i, (xi, yi) in enumerate(zip(x, y)):
+        x_digit = xi-element_dimension*0.5
+        for digit in "{:d}".format(i):
+            vertices.append(glyphs[digit].vertices*size + [x_digit, yi-element_dimension*0.25])
+            codes.append(glyphs[digit].codes)
+            x_digit += advances[digit]*size
+    if vertices:
+        # the labels are inside the squares, they do not change the limits
+        labels = Path(np.concatenate(vertices), np.concatenate(codes))
+        ax0.add_artist(PathPatch(labels, color="black", transform=ax0.transData))
+    ax0.autoscale_view()
+
+    if radius is not None:
+        # draw circle of radius = radius
+        circle = Circle((0.0, 0.0), radius=radius, edgecolor='red', fill=False, linewidth=0.5)
+        ax0.add_patch(circle)
+    if xlim is not None:
+        ax0.set_xlim(xlim)
+    if ylim is not None:
+        ax0.set_ylim(ylim)
     plt.show()
-    
-    return n, x, y, r
\ No newline at end of file
+
+    return fig
+
+
+def _rowRotations(rows, rotation):
+    # rotations of the nodes from the index of their row
+    if rotation == 1:
+        return 180.0*(rows%2)
+    elif rotation == -1:
+        return 180.0*((rows+1)%2)
+    return np.zeros(len(rows))
+
+
+@lru_cache(maxsize=None)
+def _digitGlyphs():
+    # paths and advance widths of the digits with unit size, the font is
+    # looked up only once
+    fp = FontProperties(family='Helvetica', style='normal', weight='light')
+    glyphs = {digit: TextPath((0.0, 0.0), digit, size=1.0, prop=fp) for digit in '0123456789'}
+    fp.set_size(1.0)
+    advances = {digit: text_to_path.get_text_width_height_descent(digit, fp, ismath=False)[0] for digit in '0123456789'}
+    return glyphs, advances
+
+
+def _latticeChunks(n_rows, n_columns, nodes, rotation, chunk_size):
+    # the candidate nodes of a grid are checked in blocks of chunk_size nodes,
+    # row by row from the lower one; nodes returns the coordinates and the row
+    # index of the nodes of the lattice among the given candidates
+    n_candidates = n_rows*n_columns
+    if chunk_size is None:
+        chunk_size = max(n_candidates, 1)
+    for start in range(0, n_candidates, chunk_size):
+        rows, columns = np.divmod(np.arange(start, min(start+chunk_size, n_candidates)), n_columns)
+        x, y, rows = nodes(rows, columns)
+        if len(x) > 0:
+            yield x, y, _rowRotations(rows, rotation)
+
+
+def _joinChunks(chunks):
+    # joins the blocks of a lattice
+    chunks = list(chunks)
+    if not chunks:
+        return 0, np.zeros(0), np.zeros(0), np.zeros(0)
+    x, y, r = (np.concatenate(values) for values in zip(*chunks))
+    return len(x), x, y, r
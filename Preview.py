@@ -0,0 +1,251 @@
+# KID drawer (DXF file generator) - Federico Cacciotti (c)2022
+
+# import packages
+import ezdxf
+from ezdxf.colors import aci2rgb
+import numpy as np
+import os
+from pathlib import Path
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PolyCollection, LineCollection
+
+# background color of the previews (the ezdxf modelspace background)
+PREVIEW_BACKGROUND = '#212830'
+# layers of the pixel details, not drawn in the level of detail mode
+DETAIL_LAYERS = ('PIXEL', 'CENTER', 'ABSORBER_AREA')
+# the level of detail mode is used when the PIXEL_AREA boxes are smaller
+# than this number of image pixels
+LOD_MIN_SIZE = 48
+# maximum distance in microns between curves and their flattened polylines
+FLATTENING_DISTANCE = 0.1
+# ratio between the DXF text height (cap height) and the font size
+TEXT_CAP_HEIGHT = 0.7
+
+
+# saves a preview image of a dxf drawing
+def save_preview(drawing, filename, dpi=250, layers=None, lod=None, fill=False, figsize=(6.4, 4.8), colors=None):
+    '''
+    This function saves a fast preview image of a dxf drawing. The polygons
+    and lines of each layer are drawn directly as Matplotlib collections,
+    without the ezdxf drawing Frontend. The figure is rendered off screen
+    and it is not registered in pyplot, so nothing is shown and the memory
+    is released when the function returns.
+
+    Parameters
+    ----------
+    drawing : ezdxf.document.Drawing or dict
+        The dxf drawing, ex. pixel.dxf or array.array_dxf, or its geometry
+        grouped by layer (see layout_geometry).
+    filename : string
+        Output path and filename of the image.
+    dpi : int, optional
+        Dpi of the image. The default is 250.
+    layers : list of strings, optional
+        The layers to be drawn. The default is None, i.e. all the layers.
+    lod : bool, optional
+        Level of detail mode: if True only the PIXEL_AREA boxes, the index
+        labels and the layers that do not belong to the pixels (ex.
+        FEEDLINE) are drawn. If None it is used when the pixels are too
+        small to resolve the lines of the absorbers at the given dpi. The
+        default is None.
+    fill : bool, optional
+        If True the closed polylines are filled. The default is False.
+    figsize : tuple of floats, optional
+        Size of the image in inches. The default is (6.4, 4.8).
+    colors : dict, optional
+        The AutoCAD Color Index of each layer, used when drawing is a
+        geometry dictionary. The default is None, i.e. white.
+
+    Returns
+    -------
+    None.
+
+    '''
+    # check if the output directory exists
+    filename = Path(filename)
+    if not os.path.exists(filename.parent):
+        os.makedirs(filename.parent)
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    draw_preview(ax, drawing, layers=layers, lod=lod, fill=fill, dpi=dpi, colors=colors)
+    fig.savefig(filename, dpi=dpi, facecolor=PREVIEW_BACKGROUND)
+
+
+# draws a preview of a dxf drawing on matplotlib axes
+def draw_preview(ax, drawing, layers=None, lod=None, fill=False, dpi=None, colors=None):
+    '''
+    This function draws a preview of a dxf drawing on matplotlib axes, one
+    PolyCollection (closed polylines) and one LineCollection (open
+    polylines and curves) per layer, with the layer colors. Block
+    references are drawn by transforming the geometry of their blocks,
+    which is extracted only once per block. The geometry can also be given
+    directly, ex. by a pixel in lazy mode, so that no dxf drawing is needed.
+
+    Parameters
+    ----------
+    ax : matplotlib.axes.Axes
+        The axes.
+    drawing : ezdxf.document.Drawing or dict
+        The dxf drawing or its geometry grouped by layer (see
+        layout_geometry).
+    layers : list of strings, optional
+        The layers to be drawn. The default is None, i.e. all the layers.
+    lod : bool, optional
+        Level of detail mode, see save_preview. The default is None.
+    fill : bool, optional
+        If True the closed polylines are filled. The default is False.
+    dpi : int, optional
+        The dpi used to choose the level of detail. The default is None,
+        i.e. the dpi of the figure.
+    colors : dict, optional
+        The AutoCAD Color Index of each layer, used when drawing is a
+        geometry dictionary. The default is None, i.e. white.
+
+    Returns
+    -------
+    None.
+
+    '''
+    if isinstance(drawing, dict):
+        geometry = drawing
+        colors = {} if colors is None else colors
+        colors = {layer: _aci_color(colors.get(layer, 7)) for layer in geometry}
+    else:
+        geometry = layout_geometry(drawing.modelspace(), drawing)
+        colors = {layer: _layer_color(drawing, layer) for layer in geometry}
+
+    # bounds of the drawing
+    points = [np.concatenate(geometry[layer]['polygons']+geometry[layer]['lines'])
+              for layer in geometry if geometry[layer]['polygons'] or geometry[layer]['lines']]
+    if not points:
+        print("Error. The drawing is empty.")
+        return
+    points = np.concatenate(points)
+    x_min, y_min = points.min(axis=0)
+    x_max, y_max = points.max(axis=0)
+    margin = 0.02*max(x_max-x_min, y_max-y_min, 1.0)
+    x_min, x_max, y_min, y_max = x_min-margin, x_max+margin, y_min-margin, y_max+margin
+
+    # image points per micron (the aspect ratio is equal)
+    fig = ax.get_figure()
+    dpi = fig.dpi if dpi is None else dpi
+    width, height = ax.get_position().size*fig.get_size_inches()
+    scale = min(width/(x_max-x_min), height/(y_max-y_min))
+
+    # the pixels are too small to resolve their lines
+    if lod is None:
+        boxes = geometry.get('PIXEL_AREA', {'polygons': []})['polygons']
+        lod = len(boxes) > 0 and np.median([np.ptp(box[:, 0]) for box in boxes])*scale*dpi < LOD_MIN_SIZE
+
+    if layers is None:
+        layers = list(geometry.keys())
+    if lod:
+        layers = [layer for layer in layers if layer not in DETAIL_LAYERS]
+
+    for layer in layers:
+        if layer not in geometry:
+            continue
+        color = colors[layer]
+        data = geometry[layer]
+        if data['polygons']:
+            ax.add_collection(PolyCollection(data['polygons'], closed=True, facecolors=color if fill else 'none',
+                                             edgecolors=color, linewidths=0.3))
+        if data['lines']:
+            ax.add_collection(LineCollection(data['lines'], colors=color, linewidths=0.3))
+        for x, y, text_height, text, rotation, halign in data['texts']:
+            ax.text(x, y, text, color=color, fontsize=72.0*scale*text_height/TEXT_CAP_HEIGHT, rotation=rotation,
+                    ha=('left', 'center', 'right')[min(halign, 2)], va='baseline', rotation_mode='anchor')
+
+    ax.set_xlim(x_min, x_max)
+    ax.set_ylim(y_min, y_max)
+    ax.set_aspect('equal')
+    ax.set_facecolor(PREVIEW_BACKGROUND)
+    ax.set_axis_off()
+
+
+# returns the geometry of a layout grouped by layer
+def layout_geometry(layout, drawing, blocks=None):
+    '''
+    This function returns the geometry of the entities of a layout grouped
+    by layer. Block references are expanded.
+
+    Parameters
+    ----------
+    layout : ezdxf layout
+        The modelspace or a block layout.
+    drawing : ezdxf.document.Drawing
+        The dxf drawing of the layout.
+    blocks : dict, optional
+        Cache of the geometry of the blocks already expanded. The default is
+        None.
+
+    Returns
+    -------
+    dict
+        For each layer a dictionary with the following keys:
+            - 'polygons': list of (N, 2) numpy.ndarray of closed polylines
+            - 'lines': list of (N, 2) numpy.ndarray of open polylines
+            - 'texts': list of (x, y, height, text, rotation, halign)
+
+    '''
+    if blocks is None:
+        blocks = {}
+    geometry = {}
+
+    def layer_geometry(layer):
+        if layer not in geometry:
+            geometry[layer] = {'polygons': [], 'lines': [], 'texts': []}
+        return geometry[layer]
+
+    for entity in layout:
+        dxftype = entity.dxftype()
+        if dxftype == 'INSERT':
+            name = entity.dxf.name
+            if name not in blocks:
+                blocks[name] = layout_geometry(drawing.blocks.get(name), drawing, blocks)
+            matrix = np.array(list(entity.matrix44().rows()))
+            text_scale = abs(entity.dxf.yscale)
+            for layer, data in blocks[name].items():
+                target = layer_geometry(layer)
+                target['polygons'] += [points @ matrix[:2, :2]+matrix[3, :2] for points in data['polygons']]
+                target['lines'] += [points @ matrix[:2, :2]+matrix[3, :2] for points in data['lines']]
+                for x, y, text_height, text, rotation, halign in data['texts']:
+                    x, y = np.array((x, y)) @ matrix[:2, :2]+matrix[3, :2]
+                    target['texts'].append((x, y, text_height*text_scale, text, rotation+entity.dxf.rotation, halign))
+        elif dxftype == 'TEXT':
+            halign = entity.dxf.get('halign', 0)
+            position = entity.dxf.align_point if halign and entity.dxf.hasattr('align_point') else entity.dxf.insert
+            layer_geometry(entity.dxf.layer)['texts'].append((position[0], position[1], entity.dxf.height,
+                                                              entity.dxf.text, entity.dxf.rotation, halign))
+        elif dxftype == 'LWPOLYLINE' and not entity.has_arc and tuple(entity.dxf.extrusion) == (0.0, 0.0, 1.0):
+            points = np.frombuffer(entity.lwpoints.values, dtype=float).reshape(-1, 5)[:, :2]
+            layer_geometry(entity.dxf.layer)['polygons' if entity.closed else 'lines'].append(points.copy())
+        else:
+            # curves and other entities are flattened
+            try:
+                path = ezdxf.path.make_path(entity)
+            except TypeError:
+                continue
+            points = np.array([(vertex.x, vertex.y) for vertex in path.flattening(FLATTENING_DISTANCE)])
+            if len(points) > 1:
+                closed = dxftype in ('CIRCLE', 'ELLIPSE') or (dxftype == 'LWPOLYLINE' and entity.closed)
+                layer_geometry(entity.dxf.layer)['polygons' if closed else 'lines'].append(points)
+    return geometry
+
+
+# returns the rgb color of a layer
+def _layer_color(drawing, layer):
+    color = 7
+    if drawing.layers.has_entry(layer):
+        color = abs(drawing.layers.get(layer).dxf.color)
+    return _aci_color(color)
+
+
+# returns the rgb color of an AutoCAD Color Index
+def _aci_color(color):
+    if color in (0, 7, 256):
+        return (1.0, 1.0, 1.0)
+    return tuple(channel/255.0 for channel in aci2rgb(color))
@@ -0,0 +1,208 @@
+# KID drawer (DXF file generator) - Federico Cacciotti (c)2022
+
+# import packages
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+class Profiler():
+    def __init__(self, memory=False, callback=None, enabled=True):
+        '''
+        This class records the wall time, the number of entities and
+        vertices and optionally the memory peak of each stage of the
+        construction of pixels and arrays. A profiler is given to the
+        pixel or array constructors (profiler parameter) and it can be
+        shared by many objects. Each stage produces a record, a dictionary
+        with the following keys:
+            - 'object': the class name of the profiled object
+            - 'index': the index of the profiled pixel or None
+            - 'stage': the name of the stage, ex. 'absorber', 'merge',
+                'entities', 'save_dxf'
+            - 'time': the wall time of the stage in seconds
+            - 'entities': the number of entities added to the drawing or
+                None
+            - 'vertices': the number of vertices of the geometry or of the
+                entities added to the drawing or None
+            - 'memory_peak': the peak of the memory allocated during the
+                stage in bytes (tracemalloc) or None
+
+        Parameters
+        ----------
+        memory : bool, optional
+            If True the memory peaks are measured with tracemalloc, which is
+            started if it is not running. This slows down the profiled code.
+            The default is False.
+        callback : callable, optional
+            A function called with each record as soon as its stage ends.
+            The default is None.
+        enabled : bool, optional
+            If False nothing is recorded. The default is True.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.memory = memory
+        self.callback = callback
+        self.enabled = enabled
+        self.records = []
+        self.__tracemalloc_started__ = False
+        if self.enabled and self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.__tracemalloc_started__ = True
+
+    # measures a stage
+    @contextmanager
+    def stage(self, name, owner=None, layout=None):
+        '''
+        This function is a context manager that measures a stage. It yields
+        the record of the stage, whose 'entities' and 'vertices' values can
+        be set by the profiled code. Stages must not be nested when the
+        memory is measured.
+
+        Parameters
+        ----------
+        name : string
+            The name of the stage.
+        owner : object, optional
+            The profiled pixel or array. The default is None.
+        layout : ezdxf layout, optional
+            If given the entities added to the layout during the stage and
+            their vertices are counted. The default is None.
+
+        Yields
+        ------
+        record : dict
+            The record of the stage.
+
+        '''
+        record = {'object': None if owner is None else type(owner).__name__,
+                  'index': getattr(owner, 'index', None),
+                  'stage': name,
+                  'time': None,
+                  'entities': None,
+                  'vertices': None,
+                  'memory_peak': None}
+        if not self.enabled:
+            yield record
+            return
+
+        n_entities = len(layout) if layout is not None else 0
+        if self.memory:
+            tracemalloc.reset_peak()
+            memory_start = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        yield record
+        record['time'] = time.perf_counter()-start
+        if self.memory:
+            record['memory_peak'] = tracemalloc.get_traced_memory()[1]-memory_start
+        if layout is not None:
+            entities = list(layout)[n_entities:]
+            record['entities'] = len(entities)
+            record['vertices'] = sum(_count_vertices(entity) for entity in entities)
+
+        self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    # returns the records
+    def report(self, aggregate=False):
+        '''
+        This function returns the records of the profiled stages.
+
+        Parameters
+        ----------
+        aggregate : bool, optional
+            If True the records of the same object class and stage are
+            summed (time, entities, vertices), the maximum memory peak is
+            taken and the number of records is given by the 'count' key.
+            The default is False.
+
+        Returns
+        -------
+        list of dicts
+            The records, in the order of the stages.
+
+        '''
+        if not aggregate:
+            return [dict(record) for record in self.records]
+
+        groups = {}
+        for record in self.records:
+            key = (record['object'], record['stage'])
+            if key not in groups:
+                groups[key] = {'object': record['object'], 'stage': record['stage'], 'count': 0,
+                               'time': 0.0, 'entities': None, 'vertices': None, 'memory_peak': None}
+            group = groups[key]
+            group['count'] += 1
+            group['time'] += record['time']
+            for field in ('entities', 'vertices'):
+                if record[field] is not None:
+                    group[field] = (group[field] or 0)+record[field]
+            if record['memory_peak'] is not None:
+                group['memory_peak'] = max(group['memory_peak'] or 0, record['memory_peak'])
+        return list(groups.values())
+
+    # prints the records
+    def print_report(self, aggregate=True):
+        '''
+        This function prints on screen a table of the profiled stages.
+
+        Parameters
+        ----------
+        aggregate : bool, optional
+            If True the records of the same object class and stage are
+            summed, see report. The default is True.
+
+        Returns
+        -------
+        None.
+
+        '''
+        def value(number):
+            return '-' if number is None else '{:d}'.format(number)
+
+        print("{:16s} {:>6s} {:20s} {:>10s} {:>9s} {:>10s} {:>12s}".format('object', 'index', 'stage', 'time [s]',
+                                                                           'entities', 'vertices', 'memory [B]'))
+        for record in self.report(aggregate):
+            if aggregate:
+                index = 'x{:d}'.format(record['count'])
+            else:
+                index = '-' if record['index'] is None else str(record['index'])
+            print("{:16s} {:>6s} {:20s} {:10.4f} {:>9s} {:>10s} {:>12s}".format(str(record['object']), index, record['stage'],
+                                                                               record['time'], value(record['entities']),
+                                                                               value(record['vertices']), value(record['memory_peak'])))
+
+    # clears the records
+    def clear(self):
+        '''
+        This function removes all the records.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.records = []
+
+    # stops tracemalloc
+    def stop(self):
+        '''
+        This function stops tracemalloc if it was started by the profiler.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if self.__tracemalloc_started__:
+            tracemalloc.stop()
+            self.__tracemalloc_started__ = False
+
+
+# counts the vertices of an entity (only polylines have vertices)
+def _count_vertices(entity):
+    if entity.dxftype() == 'LWPOLYLINE':
+        return len(entity)
+    return 0
@@ -0,0 +1,267 @@
+# KID drawer (DXF file generator) - Federico Cacciotti (c)2022
+
+# import packages
+import numpy as np
+from .Batch import parameters_table
+
+# vacuum permittivity in F/m
+EPSILON_0 = 8.8541878128e-12
+# relative permittivity of the silicon substrate
+SILICON_PERMITTIVITY = 11.7
+
+
+# computes the length of the inductor of hilbert pixels
+def inductor_length(vertical_size, line_width, hilbert_order, absorber_separation):
+    '''
+    This function computes the length of the midline of the inductor of the
+    HilbertLShape and HilbertIShape pixels: the Hilbert shaped absorber and
+    the two connectors between the absorber and the interdigital capacitor.
+    All the parameters can be arrays (one value per pixel).
+
+    Parameters
+    ----------
+    vertical_size : float or numpy.ndarray
+        Edge size of the absorber in microns.
+    line_width : float or numpy.ndarray
+        Width of the conductive path in microns.
+    hilbert_order : int or numpy.ndarray
+        Hilbert order of the absorber.
+    absorber_separation : float or numpy.ndarray
+        Horizontal separation of the absorber from the capacitor in microns.
+
+    Returns
+    -------
+    numpy.ndarray
+        The length of the inductor in microns.
+
+    '''
+    vertical_size, line_width, absorber_separation = (np.asarray(value, dtype=float) for value in (vertical_size, line_width, absorber_separation))
+    hilbert_order = np.asarray(hilbert_order, dtype=float)
+    # length of the segments of the hilbert curve, see functions.draw_absorber
+    L_el = (vertical_size-line_width)/(2.0**hilbert_order-1)
+    # the curve plus the initial and final horizontal offsets of half a line
+    # width and the two connectors
+    return (4.0**hilbert_order-1)*L_el+line_width+2.0*absorber_separation
+
+
+# computes the inductance of hilbert pixels
+def inductance(vertical_size, line_width, hilbert_order, absorber_separation, sheet_inductance, geometric_inductance=0.0):
+    '''
+    This function computes the inductance of the inductor of the
+    HilbertLShape and HilbertIShape pixels: the kinetic inductance, given by
+    the sheet inductance times the number of squares of the conductive path
+    (length/width), plus an optional geometric inductance per unit length.
+    All the parameters can be arrays (one value per pixel).
+
+    Parameters
+    ----------
+    vertical_size : float or numpy.ndarray
+        Edge size of the absorber in microns.
+    line_width : float or numpy.ndarray
+        Width of the conductive path in microns.
+    hilbert_order : int or numpy.ndarray
+        Hilbert order of the absorber.
+    absorber_separation : float or numpy.ndarray
+        Horizontal separation of the absorber from the capacitor in microns.
+    sheet_inductance : float or numpy.ndarray
+        Kinetic inductance of the film per square in H.
+    geometric_inductance : float or numpy.ndarray, optional
+        Geometric inductance per unit length of the conductive path in H/m.
+        The default is 0.0.
+
+    Returns
+    -------
+    numpy.ndarray
+        The inductance in H.
+
+    '''
+    length = inductor_length(vertical_size, line_width, hilbert_order, absorber_separation)
+    return sheet_inductance*length/np.asarray(line_width, dtype=float)+geometric_inductance*length*1e-6
+
+
+# computes the capacitance of interdigital capacitors
+def idc_capacitance(finger_number, finger_length, finger_width, finger_gap, epsilon_r=SILICON_PERMITTIVITY):
+    '''
+    This function computes the capacitance of an interdigital capacitor on a
+    thick substrate with the conformal mapping model of Igreja and Dias:
+    the capacitance of the N-3 interior fingers and of the two exterior ones
+    is computed from the ratio of complete elliptic integrals of the first
+    kind. A fractional finger number (the extra finger of variable length of
+    the pixels) adds the fraction of an interior finger. The model holds for
+    at least 3 fingers. All the parameters can be arrays (one value per
+    pixel).
+
+    Parameters
+    ----------
+    finger_number : float or numpy.ndarray
+        Number of fingers, with decimal digits meaning an extra finger of
+        variable length.
+    finger_length : float or numpy.ndarray
+        Length of the fingers in microns. For the HilbertLShape and
+        HilbertIShape pixels it is vertical_size-2*line_width-finger_gap.
+    finger_width : float or numpy.ndarray
+        Width of the fingers in microns.
+    finger_gap : float or numpy.ndarray
+        Gap between the fingers in microns.
+    epsilon_r : float or numpy.ndarray, optional
+        Relative permittivity of the substrate. The default is
+        SILICON_PERMITTIVITY (11.7).
+
+    Returns
+    -------
+    numpy.ndarray
+        The capacitance in F.
+
+    '''
+    interior, exterior = _idc_cells(finger_length, finger_width, finger_gap, epsilon_r)
+    return (np.asarray(finger_number, dtype=float)-3.0)*interior+exterior
+
+
+# computes the resonance frequency of lumped element resonators
+def resonance_frequency(inductance, capacitance):
+    '''
+    This function computes the resonance frequency of lumped element
+    resonators.
+
+    Parameters
+    ----------
+    inductance : float or numpy.ndarray
+        The inductance in H.
+    capacitance : float or numpy.ndarray
+        The capacitance in F.
+
+    Returns
+    -------
+    numpy.ndarray
+        The resonance frequency in Hz.
+
+    '''
+    return 1.0/(2.0*np.pi*np.sqrt(np.asarray(inductance, dtype=float)*capacitance))
+
+
+# computes the resonance frequencies of many hilbert pixels
+def pixel_frequency(parameters, sheet_inductance, epsilon_r=SILICON_PERMITTIVITY, extra_capacitance=0.0, geometric_inductance=0.0):
+    '''
+    This function computes the resonance frequencies of many HilbertLShape or
+    HilbertIShape pixels at once from their constructor parameters.
+
+    Parameters
+    ----------
+    parameters : dict of lists or list of dicts
+        The table of the constructor parameters of the pixels, see
+        generate_pixels. Only the vertical_size, line_width, hilbert_order,
+        absorber_separation and capacitor_finger_* parameters are used.
+    sheet_inductance : float
+        Kinetic inductance of the film per square in H.
+    epsilon_r : float, optional
+        Relative permittivity of the substrate. The default is
+        SILICON_PERMITTIVITY (11.7).
+    extra_capacitance : float or numpy.ndarray, optional
+        Capacitance in F added to the interdigital capacitor, ex. the
+        coupling capacitance. The default is 0.0.
+    geometric_inductance : float, optional
+        Geometric inductance per unit length of the conductive path in H/m.
+        The default is 0.0.
+
+    Returns
+    -------
+    numpy.ndarray
+        The resonance frequencies in Hz, in the order of the table.
+
+    '''
+    columns = _columns(parameters)
+    L = inductance(columns['vertical_size'], columns['line_width'], columns['hilbert_order'],
+                   columns['absorber_separation'], sheet_inductance, geometric_inductance)
+    C = idc_capacitance(columns['capacitor_finger_number'], _finger_length(columns), columns['capacitor_finger_width'],
+                        columns['capacitor_finger_gap'], epsilon_r)
+    return resonance_frequency(L, C+extra_capacitance)
+
+
+# computes the finger numbers of hilbert pixels resonating at given frequencies
+def finger_number(frequency, parameters, sheet_inductance, epsilon_r=SILICON_PERMITTIVITY, extra_capacitance=0.0, geometric_inductance=0.0):
+    '''
+    This function computes the (fractional) capacitor_finger_number of
+    HilbertLShape or HilbertIShape pixels that resonate at given
+    frequencies, ex. a frequency comb for a whole array. The capacitance is
+    linear in the finger number, so the model is inverted in closed form for
+    all the pixels together.
+
+    Parameters
+    ----------
+    frequency : float or numpy.ndarray
+        The target resonance frequencies in Hz, ex. np.linspace(190e6,
+        240e6, 415).
+    parameters : dict
+        The other constructor parameters of the pixels (vertical_size,
+        line_width, hilbert_order, absorber_separation, capacitor_finger_gap
+        and capacitor_finger_width), as a dictionary of single values or of
+        arrays with one value per frequency.
+    sheet_inductance : float
+        Kinetic inductance of the film per square in H.
+    epsilon_r : float, optional
+        Relative permittivity of the substrate. The default is
+        SILICON_PERMITTIVITY (11.7).
+    extra_capacitance : float or numpy.ndarray, optional
+        Capacitance in F added to the interdigital capacitor, ex. the
+        coupling capacitance. The default is 0.0.
+    geometric_inductance : float, optional
+        Geometric inductance per unit length of the conductive path in H/m.
+        The default is 0.0.
+
+    Returns
+    -------
+    numpy.ndarray
+        The finger numbers, in the order of the frequencies.
+
+    '''
+    columns = {name: np.asarray(value, dtype=float) for name, value in parameters.items()}
+    L = inductance(columns['vertical_size'], columns['line_width'], columns['hilbert_order'],
+                   columns['absorber_separation'], sheet_inductance, geometric_inductance)
+    C = 1.0/((2.0*np.pi*np.asarray(frequency, dtype=float))**2*L)-extra_capacitance
+    interior, exterior = _idc_cells(_finger_length(columns), columns['capacitor_finger_width'],
+                                    columns['capacitor_finger_gap'], epsilon_r)
+    fingers = 3.0+(C-exterior)/interior
+    if np.any(fingers < 3.0):
+        print("Warning. Some frequencies need less than 3 fingers, the model is extrapolated.")
+    return fingers
+
+
+# returns the parameters table as columns
+def _columns(parameters):
+    if isinstance(parameters, dict):
+        return {name: np.asarray(values, dtype=float) for name, values in parameters.items() if name != 'index'}
+    rows = parameters_table(parameters)
+    return {name: np.array([row[name] for row in rows], dtype=float) for name in rows[0] if name != 'index'}
+
+
+# returns the finger length of the hilbert pixels
+def _finger_length(columns):
+    return columns['vertical_size']-2*columns['line_width']-columns['capacitor_finger_gap']
+
+
+# computes the capacitance of an interior finger and of the two exterior fingers
+def _idc_cells(finger_length, finger_width, finger_gap, epsilon_r):
+    finger_width, finger_gap = np.asarray(finger_width, dtype=float), np.asarray(finger_gap, dtype=float)
+    # metallization ratio
+    eta = finger_width/(finger_width+finger_gap)
+    k_interior = np.sin(0.5*np.pi*eta)
+    k_exterior = 2.0*np.sqrt(eta)/(1.0+eta)
+    # the substrate and the air above the capacitor
+    scale = EPSILON_0*(epsilon_r+1.0)*np.asarray(finger_length, dtype=float)*1e-6
+    c_interior = scale*_elliptic_ratio(k_interior)
+    c_exterior = scale*_elliptic_ratio(k_exterior)
+    return 0.5*c_interior, 2.0*c_interior*c_exterior/(c_interior+c_exterior)
+
+
+# computes the ratio K(k)/K(k') of complete elliptic integrals of the first kind
+def _elliptic_ratio(k):
+    k = np.asarray(k, dtype=float)
+    # arithmetic-geometric mean, K(k) = pi/(2*agm(1, k')) and K(k') = pi/(2*agm(1, k))
+    a, b = np.ones_like(k), np.sqrt(1.0-k**2)
+    a_prime, b_prime = np.ones_like(k), k.copy()
+    for i in range(64):
+        if np.all(np.abs(a-b) <= 1e-15*a) and np.all(np.abs(a_prime-b_prime) <= 1e-15*a_prime):
+            break
+        a, b = 0.5*(a+b), np.sqrt(a*b)
+        a_prime, b_prime = 0.5*(a_prime+b_prime), np.sqrt(a_prime*b_prime)
+    return a_prime/a
@@ -0,0 +1,170 @@
+# KID drawer (DXF file generator) - Federico Cacciotti (c)2022
+
+# import packages
+from ezdxf.entities import factory
+from ezdxf.lldxf.tagwriter import TagWriter
+import shutil
+from io import StringIO
+import tempfile
+from pathlib import Path
+from .DocumentTemplate import new_drawing
+
+class StreamWriter():
+    def __init__(self, filename, doc=None):
+        '''
+        This class writes a DXF file streaming its modelspace entities
+        straight to disk, so that the memory used does not depend on the
+        number of entities. The entities are given as plain data (type,
+        attributes and vertices, see add_entity) and they are spooled to a
+        temporary file. The header, tables, blocks and objects come from a
+        regular ezdxf document (the template), which is written when the
+        writer is closed with the spooled entities appended to its
+        modelspace.
+        The writer can be used as a context manager:
+            with StreamWriter('array.dxf') as writer:
+                writer.add_entity(('TEXT', {'text': '1'}, None))
+
+        Parameters
+        ----------
+        filename : string
+            Output filename.
+        doc : ezdxf.document.Drawing, optional
+            The template document. Layers and blocks must be added to it
+            (directly or with add_layer) before closing the writer, its
+            modelspace entities are written before the streamed ones. The
+            default is None, i.e. a new empty R2018 document.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self.filename = Path(filename)
+        if doc is None:
+            doc = new_drawing()
+        self.doc = doc
+        self.n_entities = 0
+        # the streamed entities are owned by the modelspace of the template
+        self.__owner__ = self.doc.modelspace().layout_key
+        self.__spool__ = tempfile.TemporaryFile(mode='w+t', encoding=self.doc.output_encoding, errors='dxfreplace')
+        self.__tagwriter__ = TagWriter(self.__spool__, dxfversion=self.doc.dxfversion)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # nothing is written if an error occurred
+        if exc_type is None:
+            self.close()
+        else:
+            self.__spool__.close()
+
+    # adds a layer to the template document if it does not exist
+    def add_layer(self, name, attribs=None):
+        '''
+        This function adds a layer to the template document, if it does not
+        exist yet.
+
+        Parameters
+        ----------
+        name : string
+            The layer name.
+        attribs : dict, optional
+            The DXF attributes of the layer (color, linetype, ...). The
+            default is None.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if not self.doc.layers.has_entry(name):
+            self.doc.layers.new(name, dxfattribs=attribs)
+
+    # writes an entity to the spool file
+    def add_entity(self, entity):
+        '''
+        This function writes an entity to the modelspace of the output file.
+
+        Parameters
+        ----------
+        entity : tuple
+            The entity as plain data (dxftype, attribs, points), where
+            dxftype is the DXF type ('LWPOLYLINE', 'TEXT', ...), attribs is
+            the dictionary of the DXF attributes and points is a (N, 5) array
+            of the 'xyseb' vertices of a LWPOLYLINE or None for the other
+            types.
+
+        Returns
+        -------
+        None.
+
+        '''
+        dxftype, attribs, points = entity
+        # handles are reserved from the template, so that they are unique
+        handle = self.doc.entitydb.handles.next()
+        if dxftype == 'LWPOLYLINE':
+            self.__write_lwpolyline(handle, attribs, points)
+        else:
+            dxf_entity = factory.new(dxftype, dxfattribs=attribs)
+            dxf_entity.dxf.handle = handle
+            dxf_entity.dxf.owner = self.__owner__
+            dxf_entity.export_dxf(self.__tagwriter__)
+        self.n_entities += 1
+
+    # writes a LWPOLYLINE, the vertices are formatted in a single pass
+    def __write_lwpolyline(self, handle, attribs, points):
+        tagwriter = self.__tagwriter__
+        dxf_entity = factory.new('LWPOLYLINE', dxfattribs=attribs)
+        dxf_entity.dxf.handle = handle
+        dxf_entity.dxf.owner = self.__owner__
+        dxf_entity.export_base_class(tagwriter)
+        dxf_entity.export_acdb_entity(tagwriter)
+        tagwriter.write_tag2(100, 'AcDbPolyline')
+        tagwriter.write_tag2(90, len(points))
+        dxf_entity.dxf.export_dxf_attribs(tagwriter, ['flags', 'const_width', 'elevation', 'thickness'])
+        if not points[:, 2:].any():
+            # straight segments with no width
+            self.__spool__.write(''.join([' 10\n%r\n 20\n%r\n' % (x, y) for x, y in points[:, :2].tolist()]))
+        else:
+            for x, y, start_width, end_width, bulge in points.tolist():
+                tagwriter.write_tag2(10, x)
+                tagwriter.write_tag2(20, y)
+                if start_width or end_width:
+                    tagwriter.write_tag2(40, start_width)
+                    tagwriter.write_tag2(41, end_width)
+                if bulge:
+                    tagwriter.write_tag2(42, bulge)
+        dxf_entity.dxf.export_dxf_attribs(tagwriter, 'extrusion')
+
+    # writes the output file
+    def close(self):
+        '''
+        This function writes the output file: the template document with the
+        streamed entities at the end of its modelspace.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if self.__spool__.closed:
+            return
+        # the template is written last, when all the handles are used and
+        # the handle seed in its header is final
+        stream = StringIO()
+        self.doc.write(stream)
+        template = stream.getvalue()
+        start = template.find('  0\nSECTION\n  2\nENTITIES\n')
+        if start < 0:
+            self.__spool__.close()
+            print("Error. The template document has no ENTITIES section.")
+            return
+        end = template.index('  0\nENDSEC\n', start)
+
+        with open(self.filename, 'wt', encoding=self.doc.output_encoding, errors='dxfreplace') as output:
+            output.write(template[:end])
+            self.__spool__.seek(0)
+            shutil.copyfileobj(self.__spool__, output)
+            output.write(template[end:])
+        self.__spool__.close()
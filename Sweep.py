@@ -0,0 +1,173 @@
+# KID drawer (DXF file generator) - Federico Cacciotti (c)2022
+
+# import packages
+import os
+import itertools
+import traceback
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import shapely
+from . import functions as fc
+from .Batch import parameters_table
+
+# metrics computed by sweep_pixels
+SWEEP_METRICS = ('x_min', 'y_min', 'x_max', 'y_max', 'metal_area', 'absorber_fill_factor',
+                 'inductor_length', 'idc_length', 'vertices')
+
+
+# sweeps the constructor parameters of a pixel class
+def sweep_pixels(pixel_class, parameters, grid=False, workers=None, cache_dir=None, cache_size=None):
+    '''
+    This function computes the geometric metrics of many pixels (ex.
+    HilbertLShape or HilbertIShape) over a table or a cartesian grid of
+    their constructor parameters, for design studies. The pixels are built
+    in lazy mode, so no dxf drawing is ever created, in a pool of processes.
+    The pixels that only differ by their index are built once, and each
+    worker reuses the absorber outlines (see functions.draw_absorber) and
+    the fill factors it has already computed, so that an absorber is built
+    at most once per worker.
+    On platforms where the processes are spawned (Windows and Mac OS) the
+    calling script must be protected by an
+    if __name__ == '__main__':
+    statement.
+
+    Parameters
+    ----------
+    pixel_class : class
+        The pixel class, ex. HilbertLShape.
+    parameters : dict of lists or list of dicts
+        The table of the constructor parameters of the pixels (see
+        generate_pixels) or, if grid is True, a dictionary with the values
+        of each parameter (see parameter_grid). If the 'index' parameter is
+        missing the pixels are numbered from 1.
+    grid : bool, optional
+        If True the cartesian product of the values of the parameters is
+        swept. The default is False.
+    workers : int, optional
+        Number of worker processes. If 1 the pixels are built in the current
+        process. The default is None, i.e. the number of CPUs.
+    cache_dir : string or GeometryCache, optional
+        Path to a persistent geometry cache directory, or a GeometryCache,
+        passed to the pixel class. The default is None.
+    cache_size : int, optional
+        Maximum size of the geometry cache directory in bytes, passed to the
+        pixel class. The default is None, i.e. GEOMETRY_CACHE_SIZE (256 MB).
+
+    Returns
+    -------
+    results : dict of numpy.ndarray
+        The columns of the sweep, one value per pixel in the order of the
+        table: one column per constructor parameter and the following
+        metrics (NaN for the pixels that failed):
+            - 'x_min', 'y_min', 'x_max', 'y_max': the bounding box of the
+                metal of the pixel in microns, with the absorber centered
+                to the origin as in the dxf files
+            - 'metal_area': the area of the metal in square microns
+            - 'absorber_fill_factor': the fraction of the absorber area
+                covered by the metal
+            - 'inductor_length': the length of the midline of the inductor
+                in microns
+            - 'idc_length': the total length of the fingers of the
+                interdigital capacitor in microns
+            - 'vertices': the number of vertices of the metal polyline
+        and an 'error' column with None or the traceback of the error
+        raised by the pixel.
+
+    '''
+    if grid:
+        parameters = parameter_grid(parameters)
+    rows = parameters_table(parameters)
+    if len(rows) == 0:
+        print("Error. No parameters to sweep.")
+        return None
+    for i, row in enumerate(rows):
+        row.setdefault('index', i+1)
+
+    # the pixels that only differ by their index have the same metrics
+    geometries = {}
+    for i, row in enumerate(rows):
+        geometries.setdefault(_geometry_key(row), i)
+    unique = list(geometries.values())
+    # pixels sharing the same absorber are submitted one after the other
+    unique.sort(key=lambda i: tuple(str(rows[i].get(name)) for name in ('vertical_size', 'line_width', 'hilbert_order')))
+
+    metrics = {}
+    if workers == 1:
+        for i in unique:
+            metrics[_geometry_key(rows[i])] = _sweep_pixel(rows[i], pixel_class, cache_dir, cache_size)
+    else:
+        if workers is None:
+            workers = os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {i: executor.submit(_sweep_pixel, rows[i], pixel_class, cache_dir, cache_size) for i in unique}
+            for i, future in futures.items():
+                # a crashed worker or a result that can not be pickled
+                # fails only its pixel
+                try:
+                    metrics[_geometry_key(rows[i])] = future.result()
+                except Exception:
+                    metrics[_geometry_key(rows[i])] = ((np.nan,)*len(SWEEP_METRICS), traceback.format_exc())
+
+    results = {name: np.array([row.get(name) for row in rows]) for name in rows[0]}
+    for k, name in enumerate(SWEEP_METRICS):
+        results[name] = np.array([metrics[_geometry_key(row)][0][k] for row in rows], dtype=float)
+    results['error'] = [metrics[_geometry_key(row)][1] for row in rows]
+
+    for row, error in zip(rows, results['error']):
+        if error is not None:
+            print("Error. Pixel {} failed:\n{}".format(row['index'], error))
+
+    return results
+
+
+# builds the cartesian grid of some parameters
+def parameter_grid(parameters):
+    '''
+    This function builds the table of the cartesian product of the values of
+    some pixel parameters, with the last parameter changing fastest.
+
+    Parameters
+    ----------
+    parameters : dict
+        The values of each parameter, as a list or as a single value, ex.
+        {'hilbert_order': [4, 5, 6], 'line_width': 6.0, ...}.
+
+    Returns
+    -------
+    dict of lists
+        The table of the parameters, one list per parameter.
+
+    '''
+    names = list(parameters.keys())
+    values = [value if isinstance(value, (list, tuple, np.ndarray, range)) else [value] for value in parameters.values()]
+    return {name: list(column) for name, column in zip(names, zip(*itertools.product(*values)))}
+
+
+# returns the parameters of a pixel that define its geometry
+def _geometry_key(row):
+    return tuple(sorted((name, str(value)) for name, value in row.items() if name != 'index'))
+
+
+# computes the metrics of a single pixel (executed by the workers)
+def _sweep_pixel(row, pixel_class, cache_dir, cache_size):
+    try:
+        pixel = pixel_class(**row, cache_dir=cache_dir, cache_size=cache_size, lazy=True)
+        metal = pixel.layer_points(pixel.pixel_layer_name)
+        values = (*pixel.bounding_box(),
+                  pixel.metal_area(),
+                  _absorber_fill_factor(pixel.vertical_size, pixel.line_width, pixel.hilbert_order),
+                  pixel.line_length(),
+                  pixel.capacitor_finger_number*pixel.capacitor_finger_length,
+                  sum(len(points) for points in metal))
+        return values, None
+    except Exception:
+        return (np.nan,)*len(SWEEP_METRICS), traceback.format_exc()
+
+
+# computes the fraction of the absorber area covered by the metal (cached)
+@lru_cache(maxsize=fc.ABSORBER_CACHE_SIZE)
+def _absorber_fill_factor(vertical_size, line_width, hilbert_order):
+    absorber = fc.draw_absorber(vertical_size, line_width, hilbert_order)
+    area = shapely.box(0.0, 0.0, vertical_size, vertical_size)
+    return shapely.area(shapely.intersection(absorber, area))/vertical_size**2
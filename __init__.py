@@ -3,6 +3,16 @@ from . HilbertIShape import *
 from . DualPolCross import *
 from . Array import *
 from . functions import *
+from . Batch import *
+from . DocumentTemplate import *
+from . StreamWriter import *
+from . Manifest import *
+from . GeometryCache import *
+from . Profiler import *
+from . Preview import *
+from . DRC import *
+from . Resonator import *
+from . Sweep import *
 
 __version__ = '1.0.3'
 __author__ = 'Federico Cacciotti'
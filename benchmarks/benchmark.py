@@ -0,0 +1,324 @@
+# KID drawer (DXF file generator) - Federico Cacciotti (c)2022
+#
+# Benchmark suite of the package: pixel construction, save_dxf, array
+# assembly and figure rendering. The results are stored as json baselines
+# that can be compared to flag regressions.
+#
+# usage (from the parent directory of the package):
+#   python G31_KID_design/benchmarks/benchmark.py run -o baseline.json
+#   python G31_KID_design/benchmarks/benchmark.py run -o current.json
+#   python G31_KID_design/benchmarks/benchmark.py compare baseline.json current.json
+
+# import packages
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+# figures are rendered off screen
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib import pyplot as plt
+logging.getLogger('matplotlib.font_manager').setLevel(logging.ERROR)
+
+import numpy as np
+
+# the package is imported from the parent directory of the repository
+sys.path.insert(0, str(Path(__file__).absolute().parents[2]))
+import G31_KID_design as kid
+from G31_KID_design import functions as fc
+from G31_KID_design import Patterns
+
+# hilbert orders, finger numbers and array sizes of the benchmarks
+HILBERT_ORDERS = (1, 2, 3, 4, 5, 6, 7, 8)
+FINGER_NUMBERS = (1, 10, 50, 100, 200, 300)
+ARRAY_SIZES = (9, 415, 649)
+# reduced set used by the --quick option
+QUICK_HILBERT_ORDERS = (1, 3, 5)
+QUICK_FINGER_NUMBERS = (1, 50, 300)
+QUICK_ARRAY_SIZES = (9,)
+
+# pixel parameters of the 415 pixel example
+PIXEL_PARAMETERS = {'index': 1,
+                    'vertical_size': 2971.3128,
+                    'line_width': 4.0,
+                    'coupling_capacitor_length': 400.0,
+                    'coupling_capacitor_width': 100.0,
+                    'coupling_connector_width': 8.0,
+                    'coupling_capacitor_y_offset': 116.0,
+                    'capacitor_finger_number': 50.5,
+                    'capacitor_finger_gap': 4.0,
+                    'capacitor_finger_width': 4.0,
+                    'hilbert_order': 3,
+                    'absorber_separation': 100.0}
+PIXEL_PITCH = 4200.0
+
+
+# returns the parameters of a pixel
+def pixel_parameters(**kwargs):
+    '''
+    This function returns the constructor parameters of a benchmark pixel.
+
+    Parameters
+    ----------
+    **kwargs : any
+        The parameters that differ from PIXEL_PARAMETERS.
+
+    Returns
+    -------
+    dict
+        The constructor parameters.
+
+    '''
+    parameters = dict(PIXEL_PARAMETERS)
+    parameters.update(kwargs)
+    return parameters
+
+
+# returns the first n nodes of a triangular lattice
+def lattice(n_pixels):
+    '''
+    This function returns the first n_pixels nodes of the smallest circular
+    triangular lattice of Patterns with at least n_pixels nodes.
+
+    Parameters
+    ----------
+    n_pixels : int
+        Number of nodes.
+
+    Returns
+    -------
+    x : numpy.ndarray
+        The x coordinates of the nodes in microns.
+    y : numpy.ndarray
+        The y coordinates of the nodes in microns.
+    r : numpy.ndarray
+        The rotations of the nodes in degrees.
+
+    '''
+    radius = PIXEL_PITCH*np.sqrt(n_pixels/np.pi)
+    while True:
+        n, x, y, r = Patterns.circularTriangleLattice(radius, PIXEL_PITCH, PIXEL_PARAMETERS['vertical_size'], rotation=-1)
+        if n >= n_pixels:
+            return x[:n_pixels], y[:n_pixels], r[:n_pixels]
+        radius += PIXEL_PITCH
+
+
+# builds the list of benchmark cases
+def benchmark_cases(workdir, quick=False):
+    '''
+    This function builds the list of the benchmark cases. Each case is a
+    tuple (name, function, setup, repeat): setup is called once before the
+    timed runs of function.
+
+    Parameters
+    ----------
+    workdir : pathlib.Path
+        Directory for the temporary files.
+    quick : bool, optional
+        If True a reduced set of cases is returned. The default is False.
+
+    Returns
+    -------
+    list of tuples
+        The benchmark cases.
+
+    '''
+    orders = QUICK_HILBERT_ORDERS if quick else HILBERT_ORDERS
+    fingers = QUICK_FINGER_NUMBERS if quick else FINGER_NUMBERS
+    sizes = QUICK_ARRAY_SIZES if quick else ARRAY_SIZES
+    cases = []
+
+    # pixel construction, the absorber cache is cleared before each run
+    def build(pixel_class, parameters):
+        def run():
+            fc.absorber_cache_clear()
+            pixel_class(**parameters)
+        return run, lambda: None
+
+    for pixel_class in (kid.HilbertLShape, kid.HilbertIShape):
+        for order in orders:
+            cases.append(('build/{:s}/hilbert_order={:d}'.format(pixel_class.__name__, order),
+                          *build(pixel_class, pixel_parameters(hilbert_order=order)), 3))
+        for finger_number in fingers:
+            cases.append(('build/{:s}/fingers={:d}'.format(pixel_class.__name__, finger_number),
+                          *build(pixel_class, pixel_parameters(capacitor_finger_number=finger_number)), 3))
+
+    # save_dxf of a built pixel
+    def save(order):
+        pixels = {}
+        def setup():
+            pixels['pixel'] = kid.HilbertLShape(**pixel_parameters(hilbert_order=order))
+        def run():
+            pixels['pixel'].save_dxf(workdir / 'save_dxf_{:d}.dxf'.format(order))
+        return run, setup
+
+    for order in orders[::2]:
+        run, setup = save(order)
+        cases.append(('save_dxf/hilbert_order={:d}'.format(order), run, setup, 3))
+
+    # array assembly from pixel files on the Patterns lattices
+    def assemble(n_pixels):
+        pixel_path = workdir / 'pixels_{:d}'.format(n_pixels)
+        nodes = {}
+        def setup():
+            nodes['xyr'] = lattice(n_pixels)
+            if not (pixel_path / 'pixel_{:d}.dxf'.format(n_pixels)).exists():
+                fingers = np.linspace(10.0, 300.0, n_pixels)
+                parameters = [pixel_parameters(index=i+1, capacitor_finger_number=f) for i, f in enumerate(fingers)]
+                kid.generate_pixels(kid.HilbertLShape, parameters, pixel_path, workers=1)
+        def run():
+            return kid.Array(pixel_path, n_pixels, *nodes['xyr'], output_dxf='array.dxf')
+        return run, setup
+
+    for n_pixels in sizes:
+        run, setup = assemble(n_pixels)
+        cases.append(('array/n_pixels={:d}'.format(n_pixels), run, setup, 1 if n_pixels > 100 else 3))
+
+    # figure rendering of a pixel and of the 9 pixel array
+    def render(build, filename):
+        items = {}
+        def setup():
+            items['item'] = build()
+        def run():
+            items['item'].saveFig(filename, dpi=100, show=False)
+            plt.close('all')
+        return run, setup
+
+    run, setup = render(lambda: kid.HilbertLShape(**pixel_parameters(hilbert_order=5)), workdir / 'pixel.png')
+    cases.append(('saveFig/pixel', run, setup, 3))
+    array_run, array_setup = assemble(9)
+    def build_array():
+        array_setup()
+        return array_run()
+    run, setup = render(build_array, workdir / 'array.png')
+    cases.append(('saveFig/array/n_pixels=9', run, setup, 3))
+    return cases
+
+
+# runs the benchmarks
+def run(output, quick=False, select=None, repeat=None):
+    '''
+    This function runs the benchmarks and saves the results in a json file.
+
+    Parameters
+    ----------
+    output : string
+        Path to the output json file.
+    quick : bool, optional
+        If True a reduced set of cases is run. The default is False.
+    select : string, optional
+        Only the cases whose name contains this string are run. The default
+        is None, i.e. all the cases.
+    repeat : int, optional
+        Number of timed runs of each case, overrides the default of each
+        case. The default is None.
+
+    Returns
+    -------
+    dict
+        The results.
+
+    '''
+    results = {'version': kid.__version__,
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'date': datetime.now().isoformat(timespec='seconds'),
+               'benchmarks': {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, function, setup, case_repeat in benchmark_cases(Path(workdir), quick):
+            if select is not None and select not in name:
+                continue
+            setup()
+            times = []
+            for i in range(repeat or case_repeat):
+                start = time.perf_counter()
+                function()
+                times.append(time.perf_counter()-start)
+            results['benchmarks'][name] = {'min': min(times),
+                                           'median': statistics.median(times),
+                                           'times': times}
+            print("{:50s} {:10.4f} s".format(name, min(times)))
+
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=1)
+    return results
+
+
+# compares two benchmark results
+def compare(baseline, current, threshold=0.2, min_delta=0.005):
+    '''
+    This function compares two benchmark results and flags the cases that
+    got slower. The minimum time of the runs is compared.
+
+    Parameters
+    ----------
+    baseline : string
+        Path to the json file of the baseline results.
+    current : string
+        Path to the json file of the current results.
+    threshold : float, optional
+        Relative slow down that is flagged as a regression. The default is
+        0.2, i.e. 20%.
+    min_delta : float, optional
+        Absolute slow down in seconds below which a case is never flagged,
+        to ignore the noise of the fastest cases. The default is 0.005.
+
+    Returns
+    -------
+    list of strings
+        The names of the regressed cases.
+
+    '''
+    with open(baseline, 'r') as file:
+        baseline = json.load(file)
+    with open(current, 'r') as file:
+        current = json.load(file)
+
+    print("baseline: version {:s}, {:s}".format(baseline['version'], baseline['date']))
+    print("current:  version {:s}, {:s}".format(current['version'], current['date']))
+    print("{:50s} {:>10s} {:>10s} {:>8s}".format('benchmark', 'baseline', 'current', 'ratio'))
+    regressions = []
+    for name, result in current['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            print("{:50s} {:>10s} {:10.4f}".format(name, '-', result['min']))
+            continue
+        reference = baseline['benchmarks'][name]['min']
+        ratio = result['min']/reference
+        flag = ''
+        if ratio > 1.0+threshold and result['min']-reference > min_delta:
+            regressions.append(name)
+            flag = ' REGRESSION'
+        print("{:50s} {:10.4f} {:10.4f} {:8.2f}{:s}".format(name, reference, result['min'], ratio, flag))
+    for name in baseline['benchmarks']:
+        if name not in current['benchmarks']:
+            print("{:50s} {:10.4f} {:>10s}".format(name, baseline['benchmarks'][name]['min'], '-'))
+    print("{:d} regressions found.".format(len(regressions)))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark suite of G31_KID_design.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='run the benchmarks and save the results')
+    run_parser.add_argument('-o', '--output', default='benchmark.json', help='output json file')
+    run_parser.add_argument('--quick', action='store_true', help='run a reduced set of cases')
+    run_parser.add_argument('-k', '--select', default=None, help='run only the cases whose name contains this string')
+    run_parser.add_argument('-r', '--repeat', type=int, default=None, help='number of timed runs of each case')
+    compare_parser = subparsers.add_parser('compare', help='compare two results and flag the regressions')
+    compare_parser.add_argument('baseline', help='json file of the baseline results')
+    compare_parser.add_argument('current', help='json file of the current results')
+    compare_parser.add_argument('-t', '--threshold', type=float, default=0.2, help='relative slow down flagged as a regression')
+    compare_parser.add_argument('--min-delta', type=float, default=0.005, help='absolute slow down in seconds never flagged')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args.output, args.quick, args.select, args.repeat)
+    else:
+        sys.exit(1 if compare(args.baseline, args.current, args.threshold, args.min_delta) else 0)
@@ -62,5 +62,5 @@ r = [tple[3] for tple in data]
 m = [tple[4] for tple in data]
 
 input_path = Path('./pixels')
-array = Array(input_path, 415, x, y, r, m)
+array = Array(input_path, 415, x, y, r, m, manifest=input_path / 'manifest.json')
 array.saveFig("./array.png", dpi=600)
@@ -1,4 +1,4 @@
-from G31_KID_design import HilbertLShape
+from G31_KID_design import HilbertLShape, generate_pixels
 import numpy as np
 
 N_PIXEL = 415
@@ -8,18 +8,21 @@ data = np.load('./data_v3.npy')
 COUPLING_LENGTH = [data[l][3] for l in range(N_PIXEL)]
 FINGER_NUMBER = [data[n][2] for n in range(N_PIXEL)]
 
-for i in range(N_PIXEL):
-    pixel = HilbertLShape(index = i+1,
-                        vertical_size = 2971.3128,  # -0.6533 micron from feedline
-                        line_width = 4.0,
-                        coupling_capacitor_length = COUPLING_LENGTH[i],
-                        coupling_capacitor_width = 100.0,
-                        coupling_connector_width = 8.0,
-                        coupling_capacitor_y_offset = 116.0,
-                        capacitor_finger_number = FINGER_NUMBER[i],
-                        capacitor_finger_gap = 4.0,
-                        capacitor_finger_width = 4.0,
-                        hilbert_order = 3,
-                        absorber_separation = 100.0)
+parameters = {'index': [i+1 for i in range(N_PIXEL)],
+              'vertical_size': [2971.3128]*N_PIXEL,  # -0.6533 micron from feedline
+              'line_width': [4.0]*N_PIXEL,
+              'coupling_capacitor_length': COUPLING_LENGTH,
+              'coupling_capacitor_width': [100.0]*N_PIXEL,
+              'coupling_connector_width': [8.0]*N_PIXEL,
+              'coupling_capacitor_y_offset': [116.0]*N_PIXEL,
+              'capacitor_finger_number': FINGER_NUMBER,
+              'capacitor_finger_gap': [4.0]*N_PIXEL,
+              'capacitor_finger_width': [4.0]*N_PIXEL,
+              'hilbert_order': [3]*N_PIXEL,
+              'absorber_separation': [100.0]*N_PIXEL}
 
-    pixel.save_dxf('./pixels/pixel_{:d}.dxf'.format(pixel.index))
\ No newline at end of file
+if __name__ == '__main__':
+    # build and save the pixels in parallel on all the available cores,
+    # the pixels whose parameters did not change since the last run are
+    # not rebuilt
+    generate_pixels(HilbertLShape, parameters, './pixels', manifest='./pixels/manifest.json')
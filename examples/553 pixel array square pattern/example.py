@@ -3,7 +3,7 @@ from G31_KID_design.Patterns import circularSquareLattice as csl
 import numpy as np
 
 WAFER_DIAMETER = 50000.0 # microns
-n, x, y, r = csl(radius=0.5*WAFER_DIAMETER, pitch=1830.0, element_dimension=1000.0, rotation=-1)
+n, x, y, r = csl(radius=0.5*WAFER_DIAMETER, pitch=1830.0, element_dimension=1000.0, rotation=-1, plot=True)
 
 for i,(x_i,y_i) in enumerate(zip(x,y)):
     
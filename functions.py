@@ -1 +1,745 @@
-import numpy as npimport ezdxffrom ezdxf.addons import Importerfrom shapely.geometry import Polygonfrom pathlib import Pathimport os# returns a rectangle from opposite corners coordinates as a lwpolylinedef draw_rectangle_corner_dimensions(corner0, x_size, y_size):    points =    (corner0,                (corner0[0]+x_size, corner0[1]),                (corner0[0]+x_size, corner0[1]+y_size),                (corner0[0], corner0[1]+y_size))    return Polygon(points)# adds a rectangle from the center coordinates and dimensions as a lwpolylinedef draw_rectangle_center_dimensions(center, x_size, y_size):    points =   ((center[0]-0.5*x_size, center[1]-0.5*y_size),                (center[0]+0.5*x_size, center[1]-0.5*y_size),                (center[0]+0.5*x_size, center[1]+0.5*y_size),                (center[0]-0.5*x_size, center[1]+0.5*y_size))    return Polygon(points)def add_feedlineSegment(pixel, fl_width, separation, fl_length=None):        KID_width = x_offset = pixel.capacitor_finger_width*np.ceil(pixel.capacitor_finger_number) + pixel.capacitor_finger_gap*np.ceil(pixel.capacitor_finger_number-1.0) + pixel.absorber_separation + pixel.vertical_size        x_midpoint = 0.5*pixel.vertical_size - 0.5*KID_width    y0 = 0.5*pixel.vertical_size + pixel.coupling_capacitor_y_offset + pixel.coupling_capacitor_width + separation        if fl_length == None:        fl_length = x_midpoint+0.5*pixel.vertical_size + 0.2*pixel.vertical_size            x0 = x_midpoint -0.5*fl_length        points = ((x0, y0),               (x0+fl_length, y0),               (x0+fl_length, y0+fl_width),              (x0, y0+fl_width))    pixel.msp.add_lwpolyline(points, close=True, dxfattribs={"layer": 'FEEDLINE'})def draw_circularWafer(wafer_diameter, metallisable_area_diameter, filename):    # Create a new DXF R2018 drawing    dxf = ezdxf.new('R2018', setup=True)    # layer names    wafer_layer_name = "WAFER"    metallisable_area_layer_name = "METALLISABLE_AREA"        # layer colors    wafer_layer_color = 1    metallisable_area_color = 3        # adds layers    dxf.layers.add(name=wafer_layer_name, color=wafer_layer_color)    dxf.layers.add(name=metallisable_area_layer_name, color=metallisable_area_color)        # adds a modelspace    msp = dxf.modelspace()        # drawing    msp.add_circle((0.0, 0.0), radius=0.5*wafer_diameter, dxfattribs={"layer": wafer_layer_name})    msp.add_circle((0.0, 0.0), radius=0.5*metallisable_area_diameter, dxfattribs={"layer": metallisable_area_layer_name})        # make dxf directory    filename = Path(filename)    if not os.path.exists(filename.parent):        os.makedirs(filename.parent)    dxf.saveas(filename)        
\ No newline at end of file
+# KID drawer (DXF file generator) - Federico Cacciotti (c)2022
+
+# import packages
+import numpy as np
+import ezdxf
+import shapely
+import os
+from pathlib import Path
+from array import array
+from functools import lru_cache
+from shapely.geometry import Polygon
+
+
+# maximum number of absorber outlines kept in memory by draw_absorber
+ABSORBER_CACHE_SIZE = 64
+
+# distance in microns under which the rings joined by join_rings touch
+JOIN_TOLERANCE = 1e-6
+
+
+# computes many rectangles from their lower left corners and dimensions
+def draw_rectangles_corner_dimensions(corners, x_sizes, y_sizes):
+    '''
+    This function computes the vertices of many rectangles given their lower
+    left corners and their dimensions.
+
+    Parameters
+    ----------
+    corners : array_like of floats
+        (N, 2) array with the coordinates (x, y) of the lower left corners in
+        microns.
+    x_sizes : float or array_like of floats
+        Horizontal dimensions of the rectangles in microns.
+    y_sizes : float or array_like of floats
+        Vertical dimensions of the rectangles in microns.
+
+    Returns
+    -------
+    numpy.ndarray of floats
+        (N, 4, 2) array with the vertices of the rectangles in
+        counterclockwise order starting from the lower left corner.
+
+    '''
+    corners = np.asarray(corners, dtype=float).reshape(-1, 2)
+    x_sizes = np.broadcast_to(np.asarray(x_sizes, dtype=float), corners.shape[:1])
+    y_sizes = np.broadcast_to(np.asarray(y_sizes, dtype=float), corners.shape[:1])
+
+    rectangles = np.empty((corners.shape[0], 4, 2))
+    rectangles[:, :, 0] = corners[:, 0, None]+np.array([0.0, 1.0, 1.0, 0.0])*x_sizes[:, None]
+    rectangles[:, :, 1] = corners[:, 1, None]+np.array([0.0, 0.0, 1.0, 1.0])*y_sizes[:, None]
+    return rectangles
+
+
+# computes many rectangles from their centers and dimensions
+def draw_rectangles_center_dimensions(centers, x_sizes, y_sizes):
+    '''
+    This function computes the vertices of many rectangles given their
+    centers and their dimensions.
+
+    Parameters
+    ----------
+    centers : array_like of floats
+        (N, 2) array with the coordinates (x, y) of the centers in microns.
+    x_sizes : float or array_like of floats
+        Horizontal dimensions of the rectangles in microns.
+    y_sizes : float or array_like of floats
+        Vertical dimensions of the rectangles in microns.
+
+    Returns
+    -------
+    numpy.ndarray of floats
+        (N, 4, 2) array with the vertices of the rectangles in
+        counterclockwise order starting from the lower left corner.
+
+    '''
+    centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+    x_sizes = np.broadcast_to(np.asarray(x_sizes, dtype=float), centers.shape[:1])
+    y_sizes = np.broadcast_to(np.asarray(y_sizes, dtype=float), centers.shape[:1])
+    corners = centers-0.5*np.stack((x_sizes, y_sizes), axis=1)
+    return draw_rectangles_corner_dimensions(corners, x_sizes, y_sizes)
+
+
+# adds a rectangle from opposite corners coordinates
+def draw_rectangle_corner_dimensions(corner0, x_size, y_size):
+    '''
+    This function returns a rectangle given its lower left corner and its
+    dimensions.
+
+    Parameters
+    ----------
+    corner0 : tuple of floats
+        Coordinates (x, y) of the lower left corner in microns.
+    x_size : float
+        Horizontal dimension of the rectangle in microns.
+    y_size : float
+        Vertical dimension of the rectangle in microns.
+
+    Returns
+    -------
+    shapely.geometry.Polygon
+        The rectangle.
+
+    '''
+    return Polygon(draw_rectangles_corner_dimensions(corner0, x_size, y_size)[0])
+
+
+# adds a rectangle from the center coordinates and dimensions
+def draw_rectangle_center_dimensions(center, x_size, y_size):
+    '''
+    This function returns a rectangle given its center and its dimensions.
+
+    Parameters
+    ----------
+    center : tuple of floats
+        Coordinates (x, y) of the center in microns.
+    x_size : float
+        Horizontal dimension of the rectangle in microns.
+    y_size : float
+        Vertical dimension of the rectangle in microns.
+
+    Returns
+    -------
+    shapely.geometry.Polygon
+        The rectangle.
+
+    '''
+    return Polygon(draw_rectangles_center_dimensions(center, x_size, y_size)[0])
+
+
+# adds a feedline segment above a pixel
+def add_feedlineSegment(pixel, fl_width, separation, fl_length=None):
+    '''
+    This function adds a feedline segment to the FEEDLINE layer of a pixel,
+    above its coupling capacitor and horizontally centered on the pixel.
+
+    Parameters
+    ----------
+    pixel : HilbertLShape or HilbertIShape
+        The pixel.
+    fl_width : float
+        Width of the feedline in microns.
+    separation : float
+        Separation between the coupling capacitor and the feedline in
+        microns.
+    fl_length : float, optional
+        Length of the feedline segment in microns. The default is None, i.e.
+        the length is computed from the size of the pixel.
+
+    Returns
+    -------
+    None.
+
+    '''
+    KID_width = (pixel.capacitor_finger_width*np.ceil(pixel.capacitor_finger_number) +
+                 pixel.capacitor_finger_gap*np.ceil(pixel.capacitor_finger_number-1.0) +
+                 pixel.absorber_separation + pixel.vertical_size)
+
+    x_midpoint = 0.5*pixel.vertical_size - 0.5*KID_width
+    y0 = 0.5*pixel.vertical_size + pixel.coupling_capacitor_y_offset + pixel.coupling_capacitor_width + separation
+
+    if fl_length is None:
+        fl_length = x_midpoint + 0.5*pixel.vertical_size + 0.2*pixel.vertical_size
+
+    x0 = x_midpoint - 0.5*fl_length
+
+    points = ((x0, y0),
+              (x0+fl_length, y0),
+              (x0+fl_length, y0+fl_width),
+              (x0, y0+fl_width))
+    pixel.msp.add_lwpolyline(points, close=True, dxfattribs={"layer": 'FEEDLINE'})
+
+
+# draws a circular wafer and its metallisable area
+def draw_circularWafer(wafer_diameter, metallisable_area_diameter, filename):
+    '''
+    This function saves a dxf drawing with a circular wafer (WAFER layer) and
+    its metallisable area (METALLISABLE_AREA layer), both centered at the
+    origin.
+
+    Parameters
+    ----------
+    wafer_diameter : float
+        Diameter of the wafer in microns.
+    metallisable_area_diameter : float
+        Diameter of the metallisable area in microns.
+    filename : string
+        Path of the output dxf file. Its directory is created if it does not
+        exist.
+
+    Returns
+    -------
+    None.
+
+    '''
+    # create a new DXF R2018 drawing
+    dxf = ezdxf.new('R2018', setup=True)
+    # layer names
+    wafer_layer_name = "WAFER"
+    metallisable_area_layer_name = "METALLISABLE_AREA"
+
+    # layer colors
+    wafer_layer_color = 1
+    metallisable_area_color = 3
+
+    # adds layers
+    dxf.layers.add(name=wafer_layer_name, color=wafer_layer_color)
+    dxf.layers.add(name=metallisable_area_layer_name, color=metallisable_area_color)
+
+    # adds a modelspace
+    msp = dxf.modelspace()
+
+    # drawing
+    msp.add_circle((0.0, 0.0), radius=0.5*wafer_diameter, dxfattribs={"layer": wafer_layer_name})
+    msp.add_circle((0.0, 0.0), radius=0.5*metallisable_area_diameter, dxfattribs={"layer": metallisable_area_layer_name})
+
+    # make dxf directory
+    filename = Path(filename)
+    if not os.path.exists(filename.parent):
+        os.makedirs(filename.parent)
+
+    dxf.saveas(filename)
+
+
+# converts many rings of vertices to polygons
+def to_polygons(rings):
+    '''
+    This function converts many rings of vertices with the same number of
+    vertices, like the rectangles computed by draw_rectangles_*(), to
+    polygons in a single call.
+
+    Parameters
+    ----------
+    rings : array_like of floats
+        (N, M, 2) array with the vertices of N rings of M vertices each.
+
+    Returns
+    -------
+    numpy.ndarray of shapely.geometry.Polygon
+        The N polygons.
+
+    '''
+    return shapely.polygons(np.asarray(rings, dtype=float))
+
+
+# merges many polygons
+def merge_polygons(polygons):
+    '''
+    This function merges many polygons (or arrays of polygons) in a single
+    geometry.
+
+    Parameters
+    ----------
+    polygons : list of shapely geometries or arrays of shapely geometries
+        The polygons to be merged.
+
+    Returns
+    -------
+    shapely geometry
+        The union of all the polygons.
+
+    '''
+    polygons = [np.atleast_1d(np.asarray(polygon, dtype=object)) for polygon in polygons]
+    return shapely.union_all(np.concatenate(polygons)) if polygons else Polygon()
+
+
+# joins many rings that touch each other along their edges
+def join_rings(ring, rings, tolerance=JOIN_TOLERANCE):
+    '''
+    This function joins some rings of vertices to a first ring, splicing
+    their vertices where an edge of a ring lies along an edge of the rings
+    already joined. The vertices of the first ring (ex. a large absorber
+    outline) are only copied, so the cost does not grow with a boolean union
+    over all of them. The rings must not overlap and each ring must touch the
+    others only along one segment, otherwise the result is not their union.
+
+    Parameters
+    ----------
+    ring : array_like of floats
+        (N, 2) array with the vertices of the first ring in microns.
+    rings : list of array_like of floats
+        The (M, 2) arrays with the vertices of the rings to be joined.
+    tolerance : float, optional
+        Distance in microns under which two vertices, or a vertex and an
+        edge, touch. The default is JOIN_TOLERANCE.
+
+    Returns
+    -------
+    numpy.ndarray of floats
+        (K, 2) array with the vertices of the joined ring in counterclockwise
+        order, or None if a ring does not touch the others along an edge.
+
+    '''
+    joined = _counterclockwise(ring)
+    rings = [_counterclockwise(other) for other in rings]
+    while rings:
+        for k, other in enumerate(rings):
+            spliced = _splice_rings(joined, other, tolerance)
+            if spliced is not None:
+                joined = spliced
+                del rings[k]
+                break
+        else:
+            return None
+    return joined
+
+
+# returns the vertices of a ring in counterclockwise order without the closing vertex
+def _counterclockwise(ring):
+    ring = np.asarray(ring, dtype=float)
+    if np.all(ring[0] == ring[-1]):
+        ring = ring[:-1]
+    x, y = ring[:, 0], ring[:, 1]
+    area = np.sum(x*np.roll(y, -1)-np.roll(x, -1)*y)
+    return ring if area > 0.0 else ring[::-1]
+
+
+# splices a ring into another one along a common segment of two edges
+def _splice_rings(ring, other, tolerance):
+    # edges of the ring that reach the bounding box of the other ring
+    start, end = ring, np.roll(ring, -1, axis=0)
+    low, high = other.min(axis=0)-tolerance, other.max(axis=0)+tolerance
+    candidates = np.flatnonzero(((start[:, 0] <= high[0]) | (end[:, 0] <= high[0])) & ((start[:, 0] >= low[0]) | (end[:, 0] >= low[0])) &
+                                ((start[:, 1] <= high[1]) | (end[:, 1] <= high[1])) & ((start[:, 1] >= low[1]) | (end[:, 1] >= low[1])))
+
+    # pairs of edges with overlapping bounding boxes
+    other_start, other_end = other, np.roll(other, -1, axis=0)
+    tree = shapely.STRtree(shapely.box(*np.minimum(start[candidates], end[candidates]).T,
+                                       *np.maximum(start[candidates], end[candidates]).T))
+    j, k = tree.query(shapely.box(*(np.minimum(other_start, other_end)-tolerance).T,
+                                  *(np.maximum(other_start, other_end)+tolerance).T))
+    i = candidates[k]
+
+    edges = end[i]-start[i]
+    lengths = np.hypot(edges[:, 0], edges[:, 1])
+    directions = edges/np.maximum(lengths, tolerance)[:, None]
+    # the edges of the other ring lie on the edges of the ring with the
+    # opposite direction
+    starts, ends = other_start[j]-start[i], other_end[j]-start[i]
+    t_start = np.sum(starts*directions, axis=1)
+    t_end = np.sum(ends*directions, axis=1)
+    distance = np.maximum(np.abs(_cross(directions, starts)), np.abs(_cross(directions, ends)))
+    matches = np.flatnonzero((lengths > tolerance) & (distance <= tolerance) & (t_end < t_start) &
+                             (np.minimum(lengths, t_start)-np.maximum(0.0, t_end) > tolerance))
+    # a ring touching along more segments would enclose a hole
+    if len(matches) != 1:
+        return None
+
+    n = matches[0]
+    i, j, length, t_start, t_end = i[n], j[n], lengths[n], t_start[n], t_end[n]
+    # the ring leaves the edge where the common segment starts, runs around
+    # the other ring and comes back where the segment ends
+    first = start[i] if t_end <= 0.0 else other_end[j]
+    last = end[i] if t_start >= length else other_start[j]
+    ring = np.roll(ring, -(i+1), axis=0)
+    seam = np.concatenate((ring[-2:], [first], np.roll(other, -(j+1), axis=0), [last], ring[:2]))
+    return np.concatenate((_remove_collinear(seam, tolerance)[1:-1], ring[1:-1]))
+
+
+# removes the repeated and collinear vertices of a path except its end points
+def _remove_collinear(points, tolerance):
+    points = list(points)
+    k = 1
+    while k < len(points)-1:
+        before, after = points[k]-points[k-1], points[k+1]-points[k]
+        chord = points[k+1]-points[k-1]
+        if (np.hypot(before[0], before[1]) <= tolerance or
+                abs(_cross(before, after)) <= tolerance*max(np.hypot(chord[0], chord[1]), tolerance)):
+            del points[k]
+            k = max(k-1, 1)
+        else:
+            k += 1
+    return np.array(points)
+
+
+# computes the z component of the cross products of 2D vectors
+def _cross(a, b):
+    return a[..., 0]*b[..., 1]-a[..., 1]*b[..., 0]
+
+
+# translates many points
+def translate_points(points, x_offset, y_offset):
+    '''
+    This function translates an array of points.
+
+    Parameters
+    ----------
+    points : array_like of floats
+        (..., 2) array of points in microns.
+    x_offset : float
+        Horizontal translation in microns.
+    y_offset : float
+        Vertical translation in microns.
+
+    Returns
+    -------
+    numpy.ndarray of floats
+        The translated points with the same shape of the input.
+
+    '''
+    return np.asarray(points, dtype=float)+np.array([x_offset, y_offset])
+
+
+# applies affine transformations to many points
+def transform_points(points, matrices):
+    '''
+    This function applies 2D affine transformations, expressed as 3x3
+    matrices acting on homogeneous coordinates, to arrays of points.
+
+    Parameters
+    ----------
+    points : array_like of floats
+        (..., M, 2) array of points in microns.
+    matrices : array_like of floats
+        (3, 3) matrix applied to all the points or (..., 3, 3) matrices, one
+        for each group of M points.
+
+    Returns
+    -------
+    numpy.ndarray of floats
+        The transformed points with the same shape of the input.
+
+    '''
+    points = np.asarray(points, dtype=float)
+    matrices = np.asarray(matrices, dtype=float)
+    return (np.einsum('...ij,...mj->...mi', matrices[..., :2, :2], points)
+            +matrices[..., None, :2, 2])
+
+
+# computes the affine matrices that place many objects
+def placement_matrices(x_pos, y_pos, rotation=None, x_scale=None, y_scale=None):
+    '''
+    This function computes the 2D affine matrices that place N objects. Each
+    object is scaled (a scale of -1 mirrors it), then rotated around the
+    origin and finally translated.
+
+    Parameters
+    ----------
+    x_pos : array_like of floats
+        The N horizontal positions in microns.
+    y_pos : array_like of floats
+        The N vertical positions in microns.
+    rotation : array_like of floats, optional
+        The N rotation angles in degrees. The default is None (no rotation).
+    x_scale : array_like of floats, optional
+        The N horizontal scale factors. The default is None (no scaling).
+    y_scale : array_like of floats, optional
+        The N vertical scale factors. The default is None (no scaling).
+
+    Returns
+    -------
+    numpy.ndarray of floats
+        (N, 3, 3) array of matrices acting on homogeneous coordinates (see
+        transform_points()).
+
+    '''
+    x_pos = np.asarray(x_pos, dtype=float).ravel()
+    y_pos = np.broadcast_to(np.asarray(y_pos, dtype=float).ravel(), x_pos.shape)
+    angle = np.radians(np.broadcast_to(np.asarray(0.0 if rotation is None else rotation, dtype=float), x_pos.shape))
+    x_scale = np.broadcast_to(np.asarray(1.0 if x_scale is None else x_scale, dtype=float), x_pos.shape)
+    y_scale = np.broadcast_to(np.asarray(1.0 if y_scale is None else y_scale, dtype=float), x_pos.shape)
+
+    matrices = np.zeros((x_pos.shape[0], 3, 3))
+    matrices[:, 0, 0] = np.cos(angle)*x_scale
+    matrices[:, 0, 1] = -np.sin(angle)*y_scale
+    matrices[:, 1, 0] = np.sin(angle)*x_scale
+    matrices[:, 1, 1] = np.cos(angle)*y_scale
+    matrices[:, 0, 2] = x_pos
+    matrices[:, 1, 2] = y_pos
+    matrices[:, 2, 2] = 1.0
+    return matrices
+
+
+# adds a lightweight polyline from an array of points
+def add_lwpolyline(layout, points, close=True, dxfattribs=None):
+    '''
+    This function adds a lightweight polyline to an ezdxf layout, copying
+    all its vertices at once instead of appending them one by one as
+    layout.add_lwpolyline() does, which matters for the large absorbers.
+
+    Parameters
+    ----------
+    layout : ezdxf layout
+        The layout, ex. the modelspace of a drawing or a block.
+    points : array_like of floats
+        (N, 2) array of (x, y) points or (N, 5) array of (x, y, start width,
+        end width, bulge) points.
+    close : bool, optional
+        If True the polyline is closed. The default is True.
+    dxfattribs : dict, optional
+        The dxf attributes of the polyline, ex. {'layer': 'PIXEL'}. The
+        default is None.
+
+    Returns
+    -------
+    ezdxf.entities.LWPolyline
+        The polyline.
+
+    '''
+    points = np.asarray(points, dtype=float)
+    vertices = np.zeros((points.shape[0], 5))
+    vertices[:, :points.shape[1]] = points
+    polyline = layout.add_lwpolyline([], close=close, dxfattribs=dxfattribs)
+    # the vertices are stored as a flat array of (x, y, start width, end
+    # width, bulge) values
+    if isinstance(polyline.lwpoints.values, array):
+        polyline.lwpoints.values = array('d', vertices.tobytes())
+    else:
+        polyline.set_points(vertices, format='xyseb')
+    return polyline
+
+
+# draws a comb as a single polygon
+def draw_comb(x0, x1, y0, bus_width, finger_x, finger_length, finger_width, direction=1):
+    '''
+    This function returns a comb, i.e. a horizontal bus with many vertical
+    fingers attached to it, as a single polygon. The vertices of the polygon
+    are computed for all the fingers together.
+
+    Parameters
+    ----------
+    x0 : float
+        Left end of the bus in microns.
+    x1 : float
+        Right end of the bus in microns.
+    y0 : float
+        Vertical position of the edge of the bus where the fingers are
+        attached in microns.
+    bus_width : float
+        Width of the bus in microns.
+    finger_x : list of floats
+        Left edge of each finger in microns.
+    finger_length : float or list of floats
+        Length of the fingers in microns.
+    finger_width : float
+        Width of the fingers in microns.
+    direction : int, optional
+        1 if the fingers point upwards (the bus lies below y0), -1 if they
+        point downwards (the bus lies above y0). The default is 1.
+
+    Returns
+    -------
+    shapely.geometry.Polygon
+        The comb.
+
+    '''
+    finger_x = np.asarray(finger_x, dtype=float)
+    finger_length = np.broadcast_to(np.asarray(finger_length, dtype=float), finger_x.shape)
+    # fingers from right to left
+    order = np.argsort(finger_x)[::-1]
+    left = finger_x[order]
+    right = left+finger_width
+    base = np.full_like(left, y0)
+    tip = y0+direction*finger_length[order]
+    fingers = np.stack((np.stack((right, base), axis=1),
+                        np.stack((right, tip), axis=1),
+                        np.stack((left, tip), axis=1),
+                        np.stack((left, base), axis=1)), axis=1).reshape(-1, 2)
+
+    outer = y0-direction*bus_width
+    points = np.concatenate(([[x0, outer], [x1, outer], [x1, y0]], fingers, [[x0, y0]]))
+    # remove the repeated vertices of the fingers aligned to the bus ends
+    repeated = np.all(points == np.roll(points, 1, axis=0), axis=1)
+    return Polygon(points[~repeated])
+
+
+# computes the vertices of a hilbert curve
+def hilbert_curve(order):
+    '''
+    This function computes all the 4**order vertices of a Hilbert curve of a
+    given order on a unitary grid. The vertices are computed directly from
+    their index along the curve (index-to-coordinate bit manipulation), one
+    bit pair at a time for all the vertices together.
+    The curve starts at (0, 0), its first step goes along the x axis and it
+    ends at (0, 2**order-1), i.e. it is the same curve drawn by the
+    "X -> -YF+XFX+FY-", "Y -> +XF-YFY-FX+" L-system.
+
+    Parameters
+    ----------
+    order : int
+        Hilbert order of the curve.
+
+    Returns
+    -------
+    vertices : numpy.ndarray of ints
+        (4**order, 2) array with the (x, y) grid coordinates of the vertices
+        ordered along the curve.
+
+    '''
+    index = np.arange(4**order, dtype=np.int64)
+    x = np.zeros_like(index)
+    y = np.zeros_like(index)
+
+    side = 1
+    while side < 2**order:
+        rx = 1 & (index//2)
+        ry = 1 & (index^rx)
+        # rotate the sub-quadrant
+        swap = ry == 0
+        flip = swap & (rx == 1)
+        x, y = (np.where(swap, np.where(flip, side-1-y, y), x),
+                np.where(swap, np.where(flip, side-1-x, x), y))
+        # move into the quadrant
+        x += side*rx
+        y += side*ry
+        index //= 4
+        side *= 2
+
+    # swap the axes so that the first step is along the x axis
+    return np.stack((y, x), axis=1)
+
+
+# draws the outline of a hilbert shaped absorber (cached)
+@lru_cache(maxsize=ABSORBER_CACHE_SIZE)
+def draw_absorber(vertical_size, line_width, hilbert_order, method='analytic'):
+    '''
+    This function returns the outline of a Hilbert shaped absorber with the
+    lower left corner of its area placed on the origin. The conductive path
+    starts and ends on the left edge of the absorber area, half a line width
+    outside of it, where it is joined to the rest of the pixel.
+    The outlines are kept in a least recently used cache (with at most
+    ABSORBER_CACHE_SIZE elements) so that all the pixels sharing the same
+    absorber reuse the same outline, that has only to be translated in place.
+    See absorber_cache_info() and absorber_cache_clear().
+
+    Parameters
+    ----------
+    vertical_size : float
+        Edge size of the absorber in microns.
+    line_width : float
+        Width of the conductive path in microns.
+    hilbert_order : int
+        Hilbert order of the absorber.
+    method : string, optional
+        'analytic' traces the outline directly from the midline of the
+        conductive path, 'union' merges one rectangle per segment of the
+        midline. The two methods give the same polygon but the analytic one
+        is much faster. When the path is so dense that adjacent segments
+        touch each other the union method is always used. The default is
+        'analytic'.
+
+    Returns
+    -------
+    shapely.geometry.Polygon
+        The outline of the absorber.
+
+    '''
+    # vertices of the hilbert curve
+    L_el = (vertical_size-line_width)/(2.0**hilbert_order-1)
+    vertices = hilbert_curve(hilbert_order)
+
+    if method == 'analytic' and L_el > line_width:
+        # add an initial and a final horizontal offset to the hilbert pattern
+        midline = np.concatenate(([[0.0, 0.5*line_width]],
+                                  0.5*line_width+vertices*L_el,
+                                  [[0.0, vertical_size-0.5*line_width]]))
+        return Polygon(offset_midline(midline, line_width))
+
+    # add an initial and a final horizontal offset to the hilbert pattern
+    points = np.concatenate(([[0.5*line_width, 0.0]],
+                             np.diff(vertices, axis=0)*L_el,
+                             [[-0.5*line_width, 0.0]]))
+
+    # draw one rectangle for each segment of the midline
+    starting_points = np.concatenate(([[0.0, 0.0]], np.cumsum(points, axis=0)[:-1]))+[0.0, 0.5*line_width]
+    rectangles = draw_rectangles_center_dimensions(starting_points+0.5*points,
+                                                   np.abs(points[:, 0])+line_width,
+                                                   np.abs(points[:, 1])+line_width)
+    return merge_polygons([to_polygons(rectangles)])
+
+
+# computes the outline of a path of given width around its midline
+def offset_midline(midline, line_width):
+    '''
+    This function computes the outline of a conductive path of constant width
+    from the vertices of its midline. The path has square ends and mitred
+    corners, i.e. it covers the same area of the union of one rectangle
+    per segment, each one extended by half a line width at both ends. The
+    midline must not intersect itself and its non adjacent segments must be
+    more than one line width apart, otherwise the outline intersects itself.
+
+    Parameters
+    ----------
+    midline : numpy.ndarray of floats
+        (N, 2) array with the vertices of the midline in microns.
+    line_width : float
+        Width of the conductive path in microns.
+
+    Returns
+    -------
+    numpy.ndarray of floats
+        (M, 2) array with the vertices of the outline in microns.
+
+    '''
+    midline = np.asarray(midline, dtype=float)
+    # unit directions of the segments
+    directions = np.diff(midline, axis=0)
+    directions /= np.hypot(directions[:, 0], directions[:, 1])[:, None]
+    # keep only the vertices where the path changes direction
+    corner = np.any(directions[1:] != directions[:-1], axis=1)
+    keep = np.concatenate(([True], corner, [True]))
+    midline = midline[keep]
+    directions = np.concatenate((directions[:1], directions[1:][corner]))
+
+    # square ends
+    midline[0] -= 0.5*line_width*directions[0]
+    midline[-1] += 0.5*line_width*directions[-1]
+
+    # left normals of the segments before and after each vertex
+    normals = np.stack((-directions[:, 1], directions[:, 0]), axis=1)
+    normals_in = np.concatenate((normals[:1], normals))
+    normals_out = np.concatenate((normals, normals[-1:]))
+    # mitre offsets
+    cosine = np.sum(normals_in*normals_out, axis=1)
+    offsets = 0.5*line_width*(normals_in+normals_out)/(1.0+cosine)[:, None]
+
+    return np.concatenate((midline+offsets, (midline-offsets)[::-1]))
+
+
+# returns the statistics of the absorber cache
+def absorber_cache_info():
+    '''
+    This function returns the statistics of the absorber outlines cache used
+    by draw_absorber().
+
+    Returns
+    -------
+    CacheInfo
+        Named tuple with the hits, misses, maxsize and currsize fields.
+
+    '''
+    return draw_absorber.cache_info()
+
+
+# empties the absorber cache
+def absorber_cache_clear():
+    '''
+    This function removes all the absorber outlines from the cache used by
+    draw_absorber() and resets its statistics.
+
+    Returns
+    -------
+    None.
+
+    '''
+    draw_absorber.cache_clear()
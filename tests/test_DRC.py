@@ -0,0 +1,44 @@
+# KID drawer (DXF file generator) - Federico Cacciotti (c)2022
+
+# import packages
+import importlib.util
+import sys
+from pathlib import Path
+import pytest
+
+# the package is imported from the repository directory
+ROOT = Path(__file__).resolve().parents[1]
+if 'G31_KID_design' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('G31_KID_design', ROOT / '__init__.py',
+                                                  submodule_search_locations=[str(ROOT)])
+    sys.modules['G31_KID_design'] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules['G31_KID_design'])
+import G31_KID_design as kid
+
+PIXEL = dict(vertical_size=2000.0, line_width=6.0, coupling_capacitor_length=2500.0, coupling_capacitor_width=80.0,
+             coupling_connector_width=20.0, coupling_capacitor_y_offset=120.0, capacitor_finger_number=55.7,
+             capacitor_finger_gap=4.0, capacitor_finger_width=6.0, hilbert_order=4, absorber_separation=80.0)
+
+
+# two pixels placed 2000 microns apart, their metal overlaps
+@pytest.mark.parametrize('instancing', [False, True])
+def test_overlapping_pixels(tmp_path, instancing):
+    for index in (1, 2):
+        kid.HilbertLShape(index, **PIXEL).save_dxf(tmp_path / 'pixel_{:d}.dxf'.format(index))
+    array = kid.Array(tmp_path, 2, [0.0, 2000.0], [0.0, 0.0], output_dxf=str(tmp_path / 'array.dxf'),
+                      instancing=instancing)
+    violations = kid.design_rule_check(array, 10.0, verbose=False)
+
+    overlaps = [violation for violation in violations if violation['rule'] == 'overlap']
+    assert len(overlaps) > 0
+    assert all(sorted(violation['pixels']) == [1, 2] for violation in overlaps)
+    # the metal of each pixel is inside its own box
+    assert not [violation for violation in violations if violation['rule'] == 'containment']
+
+
+# two pixels far apart do not violate any rule
+def test_separated_pixels(tmp_path):
+    for index in (1, 2):
+        kid.HilbertLShape(index, **PIXEL).save_dxf(tmp_path / 'pixel_{:d}.dxf'.format(index))
+    array = kid.Array(tmp_path, 2, [0.0, 6000.0], [0.0, 0.0], output_dxf=str(tmp_path / 'array.dxf'))
+    assert kid.design_rule_check(array, 10.0, verbose=False) == []